@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Import-time regression benchmark for CLI cold start.
+
+Measures ``qwen-rag --help`` and ``qwen-rag config-show`` in fresh
+interpreters and exits non-zero when either takes longer than its budget
+(on top of bare interpreter startup). A heavy top-level import (lancedb,
+openai, tree-sitter grammars, ...) sneaking back into the CLI path shows up
+here, along with the ``python -X importtime`` breakdown that explains it.
+
+config-show has the larger budget because it loads the configuration, and
+importing pydantic and building the config models alone takes 100-150ms.
+
+    python benchmark_startup.py [--runs 5] [--budget-ms MS]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# Run from the repository root so ``-m code_rag.cli`` resolves wherever the script is started
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# CLI arguments and startup budget in milliseconds
+COMMANDS = [(["--help"], 200.0), (["config-show"], 400.0)]
+
+
+def command_time_ms(args: List[str]) -> float:
+    """Wall-clock time of a Python invocation, in milliseconds."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+                   cwd=REPO_ROOT)
+    return (time.perf_counter() - start) * 1000
+
+
+def slowest_imports(cli_args: List[str], count: int = 10) -> List[Tuple[float, str]]:
+    """Modules with the largest cumulative import time during a CLI invocation."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "code_rag.cli", *cli_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True, cwd=REPO_ROOT
+    )
+    entries = []
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            entries.append((int(parts[1]) / 1000, parts[2].rstrip()))
+    return sorted(entries, reverse=True)[:count]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="CLI cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement (the median is reported)")
+    parser.add_argument("--budget-ms", type=float,
+                        help="Maximum startup time for every command, excluding interpreter startup "
+                             "(default: a budget per command)")
+    args = parser.parse_args()
+
+    print("⏱️  CLI Cold Start Benchmark")
+    print("=" * 40)
+
+    interpreter_ms = statistics.median(command_time_ms(["-c", "pass"]) for _ in range(args.runs))
+    print(f"python -c pass: {interpreter_ms:8.1f}ms")
+
+    over_budget = []
+    for cli_args, budget_ms in COMMANDS:
+        if args.budget_ms is not None:
+            budget_ms = args.budget_ms
+        name = "qwen-rag " + " ".join(cli_args)
+        total_ms = statistics.median(
+            command_time_ms(["-m", "code_rag.cli", *cli_args]) for _ in range(args.runs)
+        )
+        startup_ms = total_ms - interpreter_ms
+        status = "✅" if startup_ms <= budget_ms else "❌"
+        print(f"{status} {name}: {startup_ms:8.1f}ms (total {total_ms:.1f}ms, budget {budget_ms:.0f}ms)")
+        if startup_ms > budget_ms:
+            over_budget.append(cli_args)
+
+    for cli_args in over_budget:
+        print(f"\nSlowest imports for qwen-rag {' '.join(cli_args)}:")
+        for cumulative_ms, module in slowest_imports(cli_args):
+            print(f"  {cumulative_ms:8.1f}ms {module}")
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""Micro-batching of concurrent requests."""
+
+import asyncio
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Coalesce concurrent single-item calls into batched calls.
+
+    Items submitted within ``window_ms`` of the first pending item are sent
+    together in one call to ``process_batch`` (sooner once ``max_batch``
+    items are waiting). Each caller gets back the result at its own position;
+    if the batch call fails, every caller in the batch gets the exception.
+    """
+
+    def __init__(self, process_batch: Callable[[List[T]], Awaitable[List[R]]],
+                 window_ms: float = 5.0, max_batch: int = 32):
+        self.process_batch = process_batch
+        self.window_ms = window_ms
+        self.max_batch = max(1, max_batch)
+        self.batches_sent = 0
+        self.items_sent = 0
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        """Queue an item for the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Send everything pending as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference so the task is not garbage-collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]):
+        self.batches_sent += 1
+        self.items_sent += len(batch)
+        try:
+            results = await self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # Callers may have given up (e.g. their deadline passed)
+            if not future.done():
+                future.set_result(result)
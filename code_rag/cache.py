@@ -0,0 +1,137 @@
+"""Caches for query embeddings and other repeated model results."""
+
+import hashlib
+import os
+import sqlite3
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Hashable
+
+
+def make_cache_key(*parts: str) -> str:
+    """Hash key parts into a fixed-size cache key."""
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for caching by collapsing whitespace (case is kept)."""
+    return " ".join(query.split())
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with optional per-entry TTL and hit statistics."""
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a value, or None if missing or expired."""
+        entry = self._data.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if self.ttl_seconds is None or time.monotonic() - stored_at <= self.ttl_seconds:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counts and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class EmbeddingCache:
+    """
+    Query embedding cache: an in-memory LRU in front of an optional SQLite file.
+
+    Keys are hashes of (model, instruction, normalized query). Vectors are
+    stored on disk as float32 blobs, so a warm disk tier survives restarts.
+    """
+
+    def __init__(self, max_size: int = 1024, path: Optional[str] = None):
+        self.memory = LRUCache(max_size)
+        self.disk_hits = 0
+        self._db: Optional[sqlite3.Connection] = None
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, instruction: str, query: str) -> str:
+        """Build the cache key for a query."""
+        return make_cache_key(model, instruction, normalize_query(query))
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Get an embedding from memory, falling back to the disk tier."""
+        embedding = self.memory.get(key)
+        if embedding is not None or self._db is None:
+            return embedding
+
+        row = self._db.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        embedding = array("f", row[0]).tolist()
+        self.disk_hits += 1
+        self.memory.put(key, embedding)
+        return embedding
+
+    def put(self, key: str, embedding: List[float]):
+        """Store an embedding in memory and on disk."""
+        self.memory.put(key, embedding)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                (key, array("f", embedding).tobytes())
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics; disk hits count as hits."""
+        stats = self.memory.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["disk_hits"] = self.disk_hits
+        stats["hit_rate"] = (stats["hits"] + self.disk_hits) / lookups if lookups else 0.0
+        return stats
+
+    def close(self):
+        """Close the disk tier."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
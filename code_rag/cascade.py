@@ -0,0 +1,111 @@
+"""Cheap first-stage scoring and banding for cascade reranking."""
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Set, NamedTuple
+
+from .database import CodeChunk
+
+
+# Weights of the cheap signals in the first-stage score
+VECTOR_WEIGHT = 0.6
+LEXICAL_WEIGHT = 0.3
+SYMBOL_WEIGHT = 0.1
+
+TERM_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9]*|\d+")
+CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+def split_terms(text: str) -> Set[str]:
+    """Split text into lowercase terms, breaking snake_case and camelCase identifiers apart."""
+    terms = set()
+    for word in TERM_PATTERN.findall(text):
+        for part in CAMEL_BOUNDARY.split(word):
+            if len(part) > 1:
+                terms.add(part.lower())
+    return terms
+
+
+def vector_similarity(distance: Optional[float], distance_type: str = "cosine") -> float:
+    """Map a LanceDB vector distance to a similarity in [0, 1]."""
+    if distance is None:
+        return 0.0
+    if distance_type == "l2":
+        return 1.0 / (1.0 + distance)
+    # cosine and dot distances are 1 - similarity
+    return min(1.0, max(0.0, 1.0 - distance))
+
+
+@dataclass
+class Candidate:
+    """A retrieved chunk with the signals used to rank it."""
+    chunk: CodeChunk
+    vector_distance: Optional[float] = None
+    lexical_score: Optional[float] = None  # BM25 score, if found by full-text search
+    cheap_score: float = 0.0
+    relevance_score: Optional[float] = None  # reranker score, if reranked
+
+
+def score_candidates(query: str, candidates: List[Candidate], distance_type: str = "cosine"):
+    """
+    Compute the first-stage score of each candidate in place.
+
+    The score combines vector similarity, the share of query terms found in
+    the chunk, and whether the query names the chunk's symbol.
+    """
+    query_terms = split_terms(query)
+    for candidate in candidates:
+        chunk = candidate.chunk
+        similarity = vector_similarity(candidate.vector_distance, distance_type)
+
+        overlap = 0.0
+        if query_terms:
+            chunk_terms = split_terms(chunk.content) | split_terms(chunk.symbol_path)
+            overlap = len(query_terms & chunk_terms) / len(query_terms)
+
+        symbol_match = 0.0
+        if chunk.symbol_name and split_terms(chunk.symbol_name) <= query_terms:
+            symbol_match = 1.0
+
+        candidate.cheap_score = (
+            VECTOR_WEIGHT * similarity + LEXICAL_WEIGHT * overlap + SYMBOL_WEIGHT * symbol_match
+        )
+
+
+class CascadePlan(NamedTuple):
+    """How the candidates of one query are split between the cascade stages."""
+    accepted: List[Candidate]  # confident enough to keep without reranking
+    to_rerank: List[Candidate]  # the ambiguous band sent to the reranker
+    rejected: int  # candidates dropped by the first stage
+    early_exit: bool  # the first stage alone decided the results
+
+
+def plan_cascade(candidates: List[Candidate], top_k: int, accept_score: float,
+                 reject_score: float, max_rerank: int, margin: float,
+                 keep_order: bool = False) -> CascadePlan:
+    """
+    Split first-stage scored candidates into accepted, reranked and rejected.
+
+    If the top ``top_k`` candidates lead the next one by at least ``margin``,
+    or enough candidates score at least ``accept_score``, the reranker is
+    skipped. Otherwise up to ``max_rerank`` candidates between
+    ``reject_score`` and ``accept_score`` are reranked to fill the remaining
+    slots, and candidates below ``reject_score`` are dropped.
+
+    The band is taken best ``cheap_score`` first, or in the order of
+    ``candidates`` if ``keep_order`` is set (e.g. candidates already in MMR
+    order, so the reranker sees diverse chunks rather than the top cluster).
+    """
+    ranked = sorted(candidates, key=lambda c: c.cheap_score, reverse=True)
+
+    if len(ranked) > top_k and ranked[top_k - 1].cheap_score - ranked[top_k].cheap_score >= margin:
+        return CascadePlan(ranked[:top_k], [], len(ranked) - top_k, True)
+
+    accepted = [c for c in ranked if c.cheap_score >= accept_score][:top_k]
+    if len(accepted) == top_k:
+        return CascadePlan(accepted, [], len(ranked) - top_k, True)
+
+    band = [c for c in (candidates if keep_order else ranked)
+            if reject_score <= c.cheap_score < accept_score][:max_rerank]
+    rejected = len(ranked) - len(accepted) - len(band)
+    return CascadePlan(accepted, band, rejected, False)
@@ -0,0 +1,83 @@
+"""Circuit breaker for unreliable model endpoints."""
+
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker with a health-check probe for half-open recovery.
+
+    * closed: requests pass; consecutive failures are counted.
+    * open: after ``failure_threshold`` failures requests are rejected
+      immediately, so callers go straight to their degraded path.
+    * half-open: once ``reset_timeout_s`` has passed, ``health_check`` is
+      probed; if healthy, a single trial request is let through and its
+      outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout_s: float = 30.0,
+                 health_check: Optional[Callable[[], Awaitable[bool]]] = None):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.health_check = health_check
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    async def allow_request(self) -> bool:
+        """Check whether a request may be sent to the protected endpoint."""
+        if self.state == self.CLOSED:
+            return True
+
+        if self.state == self.HALF_OPEN:
+            # Only one trial request at a time while recovering
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+        if time.monotonic() - self._opened_at < self.reset_timeout_s:
+            return False
+
+        # Reset timeout elapsed: probe health before letting a trial through
+        if self.health_check is not None:
+            try:
+                healthy = await self.health_check()
+            except Exception:
+                healthy = False
+            if not healthy:
+                self._open()
+                return False
+
+        self.state = self.HALF_OPEN
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self):
+        """Record a successful request, closing the circuit."""
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        """Record a failed request, opening the circuit at the threshold."""
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._open()
+
+    def record_cancelled(self):
+        """Record a request abandoned before it finished, e.g. when a deadline passed."""
+        self._trial_in_flight = False
+
+    def _open(self):
+        if self.state != self.OPEN:
+            print(f"Circuit opened after {self.failures} failure(s); retrying in {self.reset_timeout_s:g}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
@@ -1,21 +1,28 @@
 """Command Line Interface for Qwen RAG system."""
 
-import asyncio
+import json
 import sys
 from pathlib import Path
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 import click
-from tqdm import tqdm
 
-from .config import load_config, CodeRAGConfig
-from .indexer import RepositoryIndexer
-from .search import SearchService
-from .database import DatabaseManager
+# Everything else (asyncio, config, indexer, search, database, server) is
+# imported inside the commands that use it so --help and config-show start fast.
+if TYPE_CHECKING:
+    from .config import CodeRAGConfig
 
 
-def get_config(ctx) -> CodeRAGConfig:
+def _run(coroutine):
+    """Run a command's coroutine to completion."""
+    import asyncio
+    return asyncio.run(coroutine)
+
+
+def get_config(ctx) -> "CodeRAGConfig":
     """Get configuration from context or create new one."""
+    from .config import load_config
+    
     config_file = ctx.obj.get("config_file") if ctx.obj else None
     config = load_config(config_file)
     
@@ -35,6 +42,8 @@ def get_config(ctx) -> CodeRAGConfig:
                     config.search.use_reranking = not value
                 elif key == "top_k":
                     config.search.top_k_final = value
+                elif key == "server":
+                    config.server.url = value
     
     return config
 
@@ -48,6 +57,7 @@ def get_config(ctx) -> CodeRAGConfig:
 @click.option('--reranking-model', help='Reranking model name')
 @click.option('--db-path', help='Database path')
 @click.option('--disable-reranking', is_flag=True, help='Disable reranking')
+@click.option('--server', help='Send searches to a running `qwen-rag serve` (http://host:port or unix:/path)')
 @click.pass_context
 def cli(ctx, **kwargs):
     """Qwen RAG - Repository Retrieval Augmented Generation System"""
@@ -60,19 +70,31 @@ def cli(ctx, **kwargs):
 @click.option('--chunk-size', type=int, help='Maximum tokens per chunk')
 @click.option('--batch-size', default=10, help='Number of files to process in each batch')
 @click.option('--force', is_flag=True, help='Force reindexing even if repository is already indexed')
+@click.option('--optimize/--no-optimize', default=None, help='Optimize the table after indexing (default from config)')
 @click.pass_context
-def index(ctx, repository_path: Path, chunk_size: Optional[int], batch_size: int, force: bool):
+def index(ctx, repository_path: Path, chunk_size: Optional[int], batch_size: int, force: bool,
+          optimize: Optional[bool]):
     """Index a repository for search."""
     config = get_config(ctx)
     
     if chunk_size:
         config.chunking.max_tokens = chunk_size
+    if optimize is not None:
+        config.database.optimize_after_index = optimize
     
     async def _index():
+        if config.server.url:
+            from .remote import RemoteSearchClient
+            client = RemoteSearchClient(config.server.url, timeout=config.api.timeout)
+            result = await client.index(str(repository_path.absolute()), force=force)
+            print(f"Indexed on server: {result['status']} ({result['chunks']} chunks)")
+            return
+        
+        from .indexer import RepositoryIndexer
         indexer = RepositoryIndexer(config)
         await indexer.index_repository(repository_path, force_reindex=force)
     
-    asyncio.run(_index())
+    _run(_index())
 
 
 @cli.command()
@@ -87,95 +109,122 @@ def index_file(ctx, file_path: Path, chunk_size: Optional[int]):
         config.chunking.max_tokens = chunk_size
     
     async def _index_file():
+        from .indexer import RepositoryIndexer
         indexer = RepositoryIndexer(config)
         await indexer.index_single_file(file_path)
     
-    asyncio.run(_index_file())
+    _run(_index_file())
 
 
 @cli.command()
-@click.argument('query')
+@click.argument('query', required=False)
 @click.option('--top-k', type=int, help='Number of results to return')
 @click.option('--no-reranking', 'disable_reranking', is_flag=True, help='Disable reranking')
-@click.option('--chunk-type', help='Filter by chunk type (function, class, comment, etc.)')
+@click.option('--chunk-type', help='Filter by chunk type (function, method, class, text)')
 @click.option('--file-type', help='Filter by file extension (e.g., .py, .js)')
 @click.option('--no-content', is_flag=True, help='Hide content in results')
 @click.option('--max-content', type=int, default=500, help='Maximum content length to display')
+@click.option('--stream', is_flag=True, help='Stream JSON lines: provisional results first, then reranked')
+@click.option('--budget-ms', type=float, help='Latency budget; slower stages are degraded')
+@click.option('--batch', 'batch_file', type=click.File('r'),
+              help='Run every query in a file (one per line, - for stdin) and print JSON lines')
 @click.pass_context
-def search(ctx, query: str, top_k: Optional[int], disable_reranking: bool, 
+def search(ctx, query: Optional[str], top_k: Optional[int], disable_reranking: bool, 
           chunk_type: Optional[str], file_type: Optional[str], 
-          no_content: bool, max_content: int):
+          no_content: bool, max_content: int, stream: bool, budget_ms: Optional[float],
+          batch_file):
     """Search for code chunks."""
+    if query is None and batch_file is None:
+        raise click.UsageError("Provide a QUERY or --batch FILE")
+    
     config = get_config(ctx)
     
     if top_k:
         config.search.top_k_final = top_k
     if disable_reranking:
         config.search.use_reranking = False
+    if budget_ms is not None:
+        config.search.latency_budget_ms = budget_ms
     
-    async def _search():
-        search_service = SearchService(config)
-        
-        start_time = asyncio.get_event_loop().time()
-        
-        # Choose the appropriate search method based on filters
-        if chunk_type:
-            query_result = await search_service.search_by_chunk_type(
-                query=query,
-                chunk_type=chunk_type,
-                top_k=config.search.top_k_final
-            )
-        elif file_type:
-            query_result = await search_service.search_by_file_type(
-                query=query,
-                file_extension=file_type,
-                top_k=config.search.top_k_final
-            )
+    options = {
+        "top_k": config.search.top_k_final,
+        "use_reranking": config.search.use_reranking,
+        "chunk_type": chunk_type,
+        "file_extension": file_type,
+        "budget_ms": budget_ms,
+    }
+    queries = [line.strip() for line in batch_file if line.strip()] if batch_file is not None else []
+    
+    async def _remote():
+        # Thin client: a running `qwen-rag serve` does the work with warm state
+        from .remote import RemoteSearchClient
+        client = RemoteSearchClient(config.server.url, timeout=config.api.timeout)
+        if batch_file is not None:
+            for data in await client.search_many(queries, include_content=not no_content, **options):
+                print(json.dumps(data))
+        elif stream:
+            async for data in client.search_stream(query, include_content=not no_content, **options):
+                print(json.dumps(data), flush=True)
         else:
-            query_result = await search_service.search(
-                query=query,
-                top_k=config.search.top_k_final,
-                use_reranking=config.search.use_reranking
-            )
-        
-        results = query_result.results
-        end_time = asyncio.get_event_loop().time()
-        
-        print(f"Search Results for: '{query}'")
-        print(f"Found {len(results)} results in {(end_time - start_time) * 1000:.1f}ms")
-        print(f"Searched {config.search.top_k_initial} chunks")
-        print(f"Reranked: {'Yes' if config.search.use_reranking else 'No'}")
-        print("-" * 80)
-        
-        if not results:
-            print("No results found for query:", query)
-            return
-        
-        for i, result in enumerate(results, 1):
-            chunk = result.chunk
-            score = result.score
-            
-            print(f"\n{i}. {chunk.file_path}:{chunk.start_line}-{chunk.end_line} (Score: {score:.3f})")
-            print(f"   Type: {chunk.chunk_type} | File: {Path(chunk.file_path).suffix}")
-            print(f"   Repository: {chunk.repository_path}")
-            
-            if not no_content:
-                content = chunk.content
-                if len(content) > max_content:
-                    content = content[:max_content] + "..."
-                
-                print("   Content:")
-                for line in content.split('\n'):
-                    print(f"   | {line}")
-        
-        await search_service.close()
+            _print_search_result(await client.search(query, **options),
+                                 no_content, max_content)
+    
+    async def _local():
+        from .search import SearchService
+        search_service = SearchService(config)
+        try:
+            if batch_file is not None:
+                for query_result in await search_service.search_many(queries, **options):
+                    print(json.dumps(query_result.to_dict(include_content=not no_content)))
+            elif stream:
+                async for query_result in search_service.search_stream(query, **options):
+                    print(json.dumps(query_result.to_dict(include_content=not no_content)), flush=True)
+            else:
+                query_result = await search_service.search(query, **options)
+                _print_search_result(query_result.to_dict(), no_content, max_content)
+        finally:
+            await search_service.close()
     
     try:
-        asyncio.run(_search())
+        _run(_remote() if config.server.url else _local())
     except Exception as e:
         print(f"❌ Error: {e}")
 
 
+def _print_search_result(data: dict, no_content: bool, max_content: int):
+    """Print a search result dict (``QueryResult.to_dict``) for humans."""
+    results = data["results"]
+    
+    print(f"Search Results for: '{data['query']}'")
+    print(f"Found {len(results)} results in {data['execution_time_ms']:.1f}ms")
+    print(f"Searched {data['total_chunks_searched']} chunks")
+    print(f"Reranked: {'Yes' if data['reranked'] else 'No'}")
+    if data.get("degraded_stages"):
+        print(f"Degraded: {', '.join(data['degraded_stages'])}")
+    if data.get("timings_ms"):
+        print("Timings: " + ", ".join(f"{stage} {ms:.1f}ms" for stage, ms in data["timings_ms"].items()))
+    print("-" * 80)
+    
+    if not results:
+        print("No results found for query:", data["query"])
+        return
+    
+    for i, result in enumerate(results, 1):
+        location = f"{result['file_path']}:{result['start_line']}-{result['end_line']}"
+        print(f"\n{i}. {location} (Score: {result['score']:.3f})")
+        print(f"   Type: {result['chunk_type']} | File: {Path(result['file_path']).suffix}")
+        print(f"   Repository: {result['repository_path']}")
+        
+        if not no_content:
+            content = result["content"]
+            if len(content) > max_content:
+                content = content[:max_content] + "..."
+            
+            print("   Content:")
+            for line in content.split('\n'):
+                print(f"   | {line}")
+
+
 @cli.command()
 @click.pass_context
 def interactive(ctx):
@@ -183,7 +232,10 @@ def interactive(ctx):
     config = get_config(ctx)
     
     async def _interactive():
+        from .search import SearchService
+        from .database import DatabaseManager
         search_service = SearchService(config)
+        await search_service.warm_up()
         
         print("🔍 Interactive Qwen RAG Search")
         print("Enter your search queries (type 'quit' to exit, 'help' for commands)")
@@ -208,6 +260,10 @@ def interactive(ctx):
                     print(f"\n📊 Database Statistics")
                     print(f"Total chunks: {stats['total_chunks']}")
                     print(f"Repositories: {stats['repositories']}")
+                    cache_stats = search_service.embedding_service.cache_stats()
+                    print(f"Query embedding cache: {cache_stats['hits'] + cache_stats['disk_hits']} hits, "
+                          f"{cache_stats['misses'] - cache_stats['disk_hits']} misses "
+                          f"({cache_stats['hit_rate']:.0%} hit rate)")
                     continue
                 elif query.lower() == 'config':
                     print(f"\n⚙️ Current Configuration")
@@ -224,15 +280,13 @@ def interactive(ctx):
                 elif not query:
                     continue
                 
-                start_time = asyncio.get_event_loop().time()
                 query_result = await search_service.search(query, top_k=config.search.top_k_final)
-                end_time = asyncio.get_event_loop().time()
                 
                 if not query_result.results:
                     print(f"❌ No results found for: '{query}'")
                     continue
                 
-                print(f"\n✅ Found {len(query_result.results)} results ({(end_time - start_time) * 1000:.1f}ms)")
+                print(f"\n✅ Found {len(query_result.results)} results ({query_result.execution_time_ms:.1f}ms)")
                 
                 for i, result in enumerate(query_result.results, 1):
                     chunk = result.chunk
@@ -257,7 +311,19 @@ def interactive(ctx):
         
         await search_service.close()
     
-    asyncio.run(_interactive())
+    _run(_interactive())
+
+
+@cli.command()
+@click.option('--host', help='Host to listen on (default from config)')
+@click.option('--port', type=int, help='Port to listen on (default from config)')
+@click.option('--socket', 'socket_path', help='Listen on a Unix socket instead of host:port')
+@click.pass_context
+def serve(ctx, host: Optional[str], port: Optional[int], socket_path: Optional[str]):
+    """Run a search server that keeps models, caches and the database warm."""
+    config = get_config(ctx)
+    from .server import run_server
+    run_server(config, host=host, port=port, socket_path=socket_path)
 
 
 @cli.command()
@@ -267,6 +333,7 @@ def stats(ctx):
     config = get_config(ctx)
     
     async def _stats():
+        from .database import DatabaseManager
         db_manager = DatabaseManager(config)
         stats = await db_manager.get_stats()
         
@@ -275,10 +342,12 @@ def stats(ctx):
         print(f"Total chunks: {stats['total_chunks']}")
         print(f"Repositories: {stats['repositories']}")
         
-        if stats.get('repository_counts'):
+        if stats.get('repository_records'):
             print(f"\n📁 Repository Breakdown:")
-            for repo, count in stats['repository_counts'].items():
-                print(f"  {repo}: {count} chunks")
+            for record in stats['repository_records']:
+                commit = f" @ {record['commit'][:12]}" if record['commit'] else ""
+                print(f"  {record['repository_path']}: {record['chunk_count']} chunks "
+                      f"(indexed {record['indexed_at']}{commit}, {record['embedding_model']})")
         
         if stats.get('file_type_counts'):
             print(f"\n📄 File Type Breakdown:")
@@ -290,7 +359,38 @@ def stats(ctx):
             for chunk_type, count in stats['chunk_type_counts'].items():
                 print(f"  {chunk_type}: {count} chunks")
     
-    asyncio.run(_stats())
+    _run(_stats())
+
+
+@cli.command()
+@click.option('--target-rows', type=int, help='Target rows per fragment for compaction')
+@click.option('--retention-hours', type=float, help='Keep dataset versions newer than this many hours')
+@click.pass_context
+def optimize(ctx, target_rows: Optional[int], retention_hours: Optional[float]):
+    """Compact fragments, clean up old versions and update indexes."""
+    config = get_config(ctx)
+    
+    async def _optimize():
+        from .database import DatabaseManager
+        db_manager = DatabaseManager(config)
+        report = await db_manager.optimize(
+            target_rows_per_fragment=target_rows,
+            retention_hours=retention_hours
+        )
+        await db_manager.close()
+        
+        before, after = report["before"], report["after"]
+        print("🧹 Table Optimization")
+        print("-" * 30)
+        for action in report["actions"]:
+            print(f"  - {action}")
+        print(f"\nFragments: {before['fragments']} -> {after['fragments']} "
+              f"(small: {before['small_fragments']} -> {after['small_fragments']})")
+        print(f"Versions:  {before['versions']} -> {after['versions']}")
+        print(f"Bytes:     {before['bytes']:,} -> {after['bytes']:,}")
+        print(f"Rows:      {after['rows']:,}")
+    
+    _run(_optimize())
 
 
 @cli.command()
@@ -301,11 +401,12 @@ def delete(ctx, repository_path: Path):
     config = get_config(ctx)
     
     async def _delete():
+        from .database import DatabaseManager
         db_manager = DatabaseManager(config)
         deleted_count = await db_manager.delete_repository(str(repository_path.absolute()))
         print(f"✅ Deleted {deleted_count} chunks for repository: {repository_path}")
     
-    asyncio.run(_delete())
+    _run(_delete())
 
 
 @cli.command()
@@ -1,6 +1,4 @@
 from openai import AsyncOpenAI
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import aiohttp
 from typing import List, Dict, Any, Optional
 
@@ -54,7 +52,8 @@ class ExtendedOpenaiClient:
                      documents: List[str],
                      instruction: Optional[str] = None,
                      top_k: Optional[int] = None,
-                     return_documents: bool = True) -> Dict[str, Any]:
+                     return_documents: bool = True,
+                     timeout: Optional[float] = None) -> Dict[str, Any]:
         """
         Rerank documents by relevance to query using judge model
 
@@ -65,13 +64,14 @@ class ExtendedOpenaiClient:
             instruction: Custom instruction (default: "Given a web search query, retrieve relevant passages that answer the query")
             top_k: Number of top results to return (None for all)
             return_documents: Whether to include document text in response
+            timeout: Request timeout in seconds (defaults to the client timeout)
 
         Returns:
             Reranking response with sorted results
         """
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        client_timeout = aiohttp.ClientTimeout(total=timeout if timeout is not None else self.timeout)
         
-        async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with aiohttp.ClientSession(timeout=client_timeout) as session:
             async with session.post(
                 f"{self.base_url}/rerank",
                 headers=self.headers,
@@ -90,12 +90,13 @@ class ExtendedOpenaiClient:
 
                 return await response.json()
 
-    async def get_health(self) -> Dict[str, Any]:
+    async def get_health(self, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Get server health status"""
-        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        client_timeout = aiohttp.ClientTimeout(total=timeout if timeout is not None else self.timeout)
         
-        async with aiohttp.ClientSession(timeout=timeout) as session:
+        async with aiohttp.ClientSession(timeout=client_timeout) as session:
             async with session.get(f"{self.base_url}/health") as response:
+                response.raise_for_status()
                 return await response.json()
 
     async def close(self):
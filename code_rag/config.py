@@ -17,20 +17,63 @@ class APIConfig(BaseModel):
     
     reranking_model: str = Field(default="Qwen/Qwen3-Reranker-4B", description="Reranking model name")
     reranking_max_tokens: int = Field(default=32768, description="Max tokens for reranking model")  # 32k context
+    reranking_doc_max_tokens: int = Field(default=4096, description="Max tokens per document sent to the reranker")
+    rerank_max_concurrent_requests: int = Field(
+        default=4, description="Concurrent rerank requests when documents are split across requests"
+    )
+    
+    query_batch_size: int = Field(default=64, description="Max queries per embedding request")
+    query_batch_window_ms: float = Field(
+        default=5.0, description="Window for coalescing concurrent query embeddings into one request (0 disables)"
+    )
     
     # Timeouts and retries
     timeout: int = Field(default=300, description="Request timeout in seconds")
     max_retries: int = Field(default=3, description="Maximum number of retries")
+    
+    # Rerank endpoint circuit breaker
+    rerank_timeout: float = Field(default=30.0, description="Timeout in seconds for rerank endpoint requests")
+    rerank_failure_threshold: int = Field(default=3, description="Consecutive rerank failures before the circuit opens")
+    rerank_reset_timeout_s: float = Field(default=30.0, description="Seconds before an open circuit probes health again")
+    rerank_degraded_mode: str = Field(
+        default="fallback", description="Scoring while the rerank endpoint is down: 'fallback' or 'none'"
+    )
+    
+    # Per-document fallback scoring when the rerank endpoint is unavailable
+    fallback_rerank_concurrency: int = Field(default=8, description="Concurrent fallback scoring calls")
+    fallback_rerank_timeout: float = Field(default=30.0, description="Timeout in seconds per fallback scoring call")
 
 
 class DatabaseConfig(BaseModel):
     """Database configuration for LanceDB."""
     path: str = Field(default="./rag_db", description="Database path")
     table_name: str = Field(default="code_chunks", description="Table name for code chunks")
+    repositories_table_name: str = Field(default="repositories", description="Table name for repository metadata")
     
     # Vector search configuration
     search_limit: int = Field(default=20, description="Initial search limit")
-    nprobes: int = Field(default=1, description="Number of probes for vector search")
+    nprobes: int = Field(default=20, description="Number of probes for vector search")
+    distance_type: str = Field(default="cosine", description="Distance metric for vector search and index")
+    
+    # "flat" answers vector searches from a memory-mapped, read-only snapshot that search
+    # processes share through the page cache; the indexer publishes a new one after each run
+    vector_backend: str = Field(default="lancedb", description="Vector search backend: 'lancedb' or 'flat'")
+    flat_index_dtype: str = Field(default="float16", description="Storage type of the flat index: 'float16' or 'float32'")
+    flat_index_path: Optional[str] = Field(
+        default=None, description="Directory of flat index snapshots (defaults to <path>/flat_index)"
+    )
+    
+    # Blocking LanceDB calls run on this many dedicated threads
+    io_threads: int = Field(default=4, description="Thread pool size for database I/O")
+    read_consistency_interval_s: float = Field(
+        default=5.0, description="Seconds between checks for table versions written by other processes"
+    )
+    
+    # Table maintenance
+    optimize_after_index: bool = Field(default=True, description="Run table optimization after indexing")
+    target_rows_per_fragment: int = Field(default=1024 * 1024, description="Target fragment size for compaction")
+    version_retention_hours: float = Field(default=1.0, description="Keep dataset versions newer than this")
+    vector_index_min_rows: int = Field(default=50000, description="Build a vector index once the table has this many rows")
 
 
 class ChunkingConfig(BaseModel):
@@ -60,7 +103,70 @@ class SearchConfig(BaseModel):
     use_reranking: bool = Field(default=True, description="Enable reranking")
     top_k_initial: int = Field(default=20, description="Initial number of results to retrieve")
     top_k_final: int = Field(default=5, description="Final number of results after reranking")
-    similarity_threshold: float = Field(default=0.1, description="Minimum similarity threshold")
+    similarity_threshold: float = Field(
+        default=0.1, description="Minimum vector similarity for a candidate to be kept or reranked"
+    )
+    
+    # Identifier queries ("parse_gitignore", "SearchService.search") skip the models
+    symbol_lookup: bool = Field(default=True, description="Answer identifier queries from the symbol index")
+    
+    # Hybrid retrieval: BM25 and vector results fused with reciprocal rank fusion
+    hybrid_search: bool = Field(default=True, description="Combine full-text and vector retrieval")
+    rrf_k: int = Field(default=60, description="Rank offset k for reciprocal rank fusion")
+    vector_weight: float = Field(default=1.0, description="Weight of vector ranks in fusion")
+    lexical_weight: float = Field(default=1.0, description="Weight of full-text ranks in fusion")
+    
+    # Cascade reranking: a cheap first-stage score decides which candidates reach the reranker
+    cascade: bool = Field(default=True, description="Only rerank candidates the first stage cannot decide")
+    cascade_accept_score: float = Field(default=0.85, description="First-stage score kept without reranking")
+    cascade_reject_score: float = Field(default=0.1, description="First-stage score below which candidates are dropped")
+    cascade_max_rerank: int = Field(default=20, description="Maximum candidates sent to the reranker per query")
+    cascade_margin: float = Field(
+        default=0.15, description="Skip reranking when the top results lead the rest by this first-stage margin"
+    )
+    
+    # Diversification before reranking: near-duplicates are dropped, the rest ordered by MMR
+    diversify: bool = Field(default=True, description="Drop near-duplicate candidates and order them by MMR")
+    duplicate_threshold: float = Field(
+        default=0.95, description="Embedding cosine similarity at which a candidate duplicates a better one"
+    )
+    mmr_lambda: float = Field(
+        default=0.7, description="MMR trade-off between relevance (1.0) and diversity (0.0)"
+    )
+    
+    # Batch search (search_many / search --batch)
+    batch_concurrency: int = Field(default=8, description="Searches run concurrently in batch mode")
+    
+    # Per-query latency budget: stages that would overrun it are degraded
+    latency_budget_ms: Optional[float] = Field(default=None, description="Per-query time budget (None disables)")
+    vector_min_budget_ms: float = Field(
+        default=50.0, description="Below this remaining budget the vector search uses degraded_nprobes"
+    )
+    degraded_nprobes: int = Field(default=5, description="Probes for vector search when short on time")
+    rerank_min_budget_ms: float = Field(default=200.0, description="Below this remaining budget reranking is skipped")
+    rerank_full_budget_ms: float = Field(
+        default=1000.0, description="Below this remaining budget only a proportional share is reranked"
+    )
+
+
+class CacheConfig(BaseModel):
+    """Configuration for query-time caches."""
+    query_embedding_cache_size: int = Field(default=1024, description="Max query embeddings kept in memory (0 disables)")
+    query_embedding_cache_path: Optional[str] = Field(
+        default=None, description="SQLite file for persisting query embeddings across runs"
+    )
+    rerank_cache_size: int = Field(default=10000, description="Max cached reranker scores (0 disables)")
+    rerank_cache_ttl_s: float = Field(default=3600.0, description="Seconds a cached reranker score stays valid")
+
+
+class ServerConfig(BaseModel):
+    """Configuration for the search server (qwen-rag serve) and its clients."""
+    host: str = Field(default="127.0.0.1", description="Host to listen on")
+    port: int = Field(default=8765, description="Port to listen on")
+    socket_path: Optional[str] = Field(default=None, description="Listen on this Unix socket instead of host:port")
+    url: Optional[str] = Field(
+        default=None, description="Send CLI searches to this server (http://host:port or unix:/path)"
+    )
 
 
 class CodeRAGConfig(BaseModel):
@@ -69,6 +175,8 @@ class CodeRAGConfig(BaseModel):
     database: DatabaseConfig = Field(default_factory=DatabaseConfig)
     chunking: ChunkingConfig = Field(default_factory=ChunkingConfig)
     search: SearchConfig = Field(default_factory=SearchConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    server: ServerConfig = Field(default_factory=ServerConfig)
     
     @classmethod
     def from_env(cls) -> "CodeRAGConfig":
@@ -105,6 +213,10 @@ class CodeRAGConfig(BaseModel):
         if os.getenv("RAG_TOP_K"):
             config.search.top_k_final = int(os.getenv("RAG_TOP_K"))
         
+        # Server configuration
+        if os.getenv("RAG_SERVER_URL"):
+            config.server.url = os.getenv("RAG_SERVER_URL")
+        
         return config
     
     @classmethod
@@ -2,7 +2,13 @@
 
 import os
 import asyncio
-from typing import List, Dict, Any, Optional, NamedTuple
+import functools
+import hashlib
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Dict, Any, Optional, NamedTuple, Callable, Tuple
 from pathlib import Path
 import json
 
@@ -10,7 +16,9 @@ import lancedb
 from lancedb.pydantic import LanceModel, Vector
 from pydantic import Field
 
+from .batching import MicroBatcher
 from .config import CodeRAGConfig
+from .flat_index import FlatIndex, SNAPSHOT_COLUMNS, current_snapshot, publish_snapshot
 from .tree_sitter_utils import ChunkWithLocation
 
 
@@ -26,7 +34,15 @@ class CodeChunk(LanceModel):
     end_char: int = Field(description="Ending character position in the file")
     file_extension: str = Field(description="File extension")
     repository_path: str = Field(description="Path to the repository root")
-    chunk_type: str = Field(description="Type of code chunk (function, class, etc.)")
+    chunk_type: str = Field(description="Type of code chunk (function, method, class, text)")
+    symbol_path: str = Field(default="", description="Dotted symbol path of the chunk (e.g. MyClass.method)")
+    symbol_name: str = Field(default="", description="Declared name of the chunk's symbol")
+    symbol_kind: str = Field(default="", description="Kind of symbol (function, method, class)")
+    language: str = Field(default="", description="Source language of the chunk")
+    node_type: str = Field(default="", description="Tree-sitter node type of the chunk")
+    parent_symbol: str = Field(default="", description="Symbol path of the enclosing symbol")
+    depth: int = Field(default=0, description="Number of enclosing symbols")
+    content_hash: str = Field(default="", description="SHA-1 of the chunk content")
     embedding: Vector(2560) = Field(description="Vector embedding of the content")  # Qwen3-Embedding-4B has 2560 dimensions
     
     def get_location_string(self) -> str:
@@ -43,66 +59,341 @@ class CodeChunk(LanceModel):
         return f"```{self.file_extension[1:] if self.file_extension.startswith('.') else self.file_extension}\n{context_content}\n```"
 
 
+class RepositoryRecord(LanceModel):
+    """Per-repository indexing metadata, one row per indexed repository."""
+    
+    repository_path: str = Field(description="Path to the repository root")
+    chunk_count: int = Field(description="Number of chunks stored for the repository")
+    indexed_at: str = Field(description="ISO-8601 timestamp of the last index run")
+    commit: str = Field(default="", description="Git commit of the repository at index time")
+    embedding_model: str = Field(default="", description="Embedding model used for the chunks")
+
+
+# Columns covered by the BM25 full-text index
+FULL_TEXT_COLUMNS = ["content", "symbol_path"]
+
+# Low-cardinality columns used as search filters, indexed with bitmaps
+FILTER_COLUMNS = ["repository_path", "chunk_type", "language", "file_extension"]
+
+# SQL defaults for chunk columns added after the first release, used to upgrade older tables
+MIGRATION_DEFAULTS = {
+    "symbol_path": "CAST('' AS STRING)",
+    "symbol_name": "CAST('' AS STRING)",
+    "symbol_kind": "CAST('' AS STRING)",
+    "language": "CAST('' AS STRING)",
+    "node_type": "CAST('' AS STRING)",
+    "parent_symbol": "CAST('' AS STRING)",
+    "depth": "CAST(0 AS BIGINT)",
+    "content_hash": "CAST('' AS STRING)",
+}
+
+
+def compute_content_hash(content: str) -> str:
+    """Hash chunk content for change detection."""
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def compute_chunk_id(repository_path: str, chunk: ChunkWithLocation, occurrence: int = 0) -> str:
+    """
+    Derive a stable chunk ID from (repository, file, symbol path, content hash).
+    
+    The same chunk gets the same ID on every run, so re-indexing can upsert
+    instead of appending duplicates. ``occurrence`` tells apart identical
+    chunks in one file (e.g. repeated module-level blocks); the first keeps
+    the plain ID.
+    """
+    parts = [
+        repository_path,
+        chunk.file_path,
+        chunk.symbol_path,
+        compute_content_hash(chunk.content),
+    ]
+    if occurrence:
+        parts.append(str(occurrence))
+    return hashlib.sha1("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def compute_chunk_ids(repository_path: str, chunks: List[ChunkWithLocation]) -> List[str]:
+    """
+    Chunk IDs for a list of chunks, numbering identical chunks of a file in order.
+    
+    Occurrences are counted in file order rather than by line number, so
+    edits elsewhere in the file do not change any ID.
+    """
+    seen: Dict[Tuple[str, str, str], int] = {}
+    ids = []
+    for chunk in chunks:
+        key = (chunk.file_path, chunk.symbol_path, chunk.content)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        ids.append(compute_chunk_id(repository_path, chunk, occurrence))
+    return ids
+
+
+def _quote(value: str) -> str:
+    """Quote a string literal for a LanceDB SQL filter."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _in_list(values: List[str]) -> str:
+    """Format values as a SQL IN list."""
+    return "(" + ", ".join(_quote(v) for v in values) + ")"
+
+
+def build_filter(repository_path: Optional[str] = None, chunk_type: Optional[str] = None,
+                 file_extension: Optional[str] = None, language: Optional[str] = None) -> Optional[str]:
+    """Build a SQL filter for search pushdown from optional column values."""
+    conditions = [
+        f"{column} = {_quote(value)}"
+        for column, value in (
+            ("repository_path", repository_path),
+            ("chunk_type", chunk_type),
+            ("file_extension", file_extension),
+            ("language", language),
+        )
+        if value
+    ]
+    return " AND ".join(conditions) if conditions else None
+
+
+_FILTER_CONDITION = re.compile(r"(\w+) = '((?:[^']|'')*)'(?: AND |$)")
+
+
+def parse_filter(where: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Invert ``build_filter``: map a filter back to column -> value.
+    
+    Returns None if ``where`` is not an AND of equality tests on filter columns.
+    """
+    filters = {}
+    position = 0
+    while where and position < len(where):
+        match = _FILTER_CONDITION.match(where, position)
+        if not match or match.group(1) not in FILTER_COLUMNS:
+            return None
+        filters[match.group(1)] = match.group(2).replace("''", "'")
+        position = match.end()
+    return filters
+
+
+def _value_counts(column) -> Dict[str, int]:
+    """Count distinct values of an Arrow column."""
+    counts = column.value_counts().to_pylist() if len(column) else []
+    return {item["values"]: item["counts"] for item in counts}
+
+
+class ScoredChunk(NamedTuple):
+    """A retrieved chunk with the raw score of the search that found it."""
+    chunk: CodeChunk
+    score: float  # vector distance (lower is closer) or BM25 score (higher is better)
+
+
+def _to_scored_chunks(rows: List[Dict[str, Any]], score_column: str) -> List[ScoredChunk]:
+    """Convert result rows to chunks, keeping the search score column."""
+    return [ScoredChunk(CodeChunk(**row), float(row.pop(score_column, 0.0))) for row in rows]
+
+
 class SearchResult(NamedTuple):
-    """Search result with relevance information."""
+    """
+    Search result with relevance information.
+    
+    ``score`` is calibrated to [0, 1]: the reranker's relevance probability
+    when the result was reranked, otherwise the first-stage score. The raw
+    vector distance and reranker score are kept alongside it.
+    """
     chunk: CodeChunk
     score: float
     rank: int
+    vector_distance: Optional[float] = None
+    relevance_score: Optional[float] = None
 
 
 class DatabaseManager:
-    """Manager for LanceDB operations."""
+    """
+    Manager for LanceDB operations.
+    
+    LanceDB's Python API is synchronous, so every call runs on a dedicated
+    thread pool. Database I/O then overlaps with embedding and rerank requests
+    instead of blocking the event loop.
+    
+    The connection and table handles are opened once and cached for the life of
+    the manager. LanceDB re-checks the dataset version at most once per
+    ``read_consistency_interval_s`` and only reloads the manifest when another
+    writer has committed a new version.
+    
+    With ``database.vector_backend: flat`` vector searches are answered from
+    the current ``FlatIndex`` snapshot instead, which the indexer publishes
+    after each run. Concurrent searches are coalesced into one matrix product.
+    """
     
     def __init__(self, config: CodeRAGConfig):
         self.config = config
         self.db_path = config.database.path
         self.table_name = config.database.table_name
+        self.repo_table_name = config.database.repositories_table_name
         self.db = None
         self.table = None
+        self.repo_table = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._init_lock: Optional[asyncio.Lock] = None
         
-    async def initialize(self):
-        """Initialize the database connection."""
-        try:
-            # Create database directory if it doesn't exist
-            os.makedirs(self.db_path, exist_ok=True)
-            
-            # Connect to LanceDB
-            self.db = lancedb.connect(self.db_path)
-            
-            # Check if table exists, create if not
-            if self.table_name in self.db.table_names():
-                self.table = self.db.open_table(self.table_name)
-                print(f"Opened existing table: {self.table_name}")
-            else:
-                # Create empty table with schema
-                self.table = self.db.create_table(self.table_name, schema=CodeChunk)
-                print(f"Created new table: {self.table_name}")
-                
-        except Exception as e:
-            print(f"Error initializing database: {e}")
-            raise
+        self.use_flat_index = config.database.vector_backend == "flat"
+        if self.use_flat_index and config.database.distance_type != "cosine":
+            print("Warning: the flat vector backend only supports cosine distance; using LanceDB")
+            self.use_flat_index = False
+        self.flat_index_path = config.database.flat_index_path or os.path.join(self.db_path, "flat_index")
+        self.flat_index: Optional[FlatIndex] = None
+        self._flat_lock: Optional[asyncio.Lock] = None
+        self._flat_checked_at = 0.0
+        # A zero window batches the searches issued in the same event-loop iteration,
+        # so the concurrent vector searches of SearchService.search_many share one pass
+        self._flat_batcher = MicroBatcher(self._search_flat_batch, window_ms=0, max_batch=64)
     
-    async def add_chunks(self, chunks: List[ChunkWithLocation], embeddings: List[List[float]], repository_path: str):
-        """Add code chunks with their embeddings to the database."""
-        if not chunks or not embeddings:
+    async def _run(self, func: Callable, *args, **kwargs):
+        """Run a blocking LanceDB call on the database thread pool."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.config.database.io_threads,
+                thread_name_prefix="lancedb"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        
+    async def initialize(self):
+        """Initialize the database connection (no-op once the table is open)."""
+        if self.table is not None:
             return
+        
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        
+        async with self._init_lock:
+            if self.table is not None:
+                return
+            try:
+                await self._run(self._open_table)
+            except Exception as e:
+                print(f"Error initializing database: {e}")
+                raise
+    
+    async def refresh(self) -> int:
+        """Move the cached table to the latest dataset version and return it."""
+        await self.initialize()
+        await self._run(self.table.checkout_latest)
+        self._flat_checked_at = 0.0
+        return await self.get_version()
+    
+    async def get_version(self) -> int:
+        """Get the dataset version of the cached table handle."""
+        await self.initialize()
+        return await self._run(lambda: self.table.version)
+    
+    async def warm_up(self) -> List[str]:
+        """
+        Open the table and pre-load index metadata into the LanceDB cache.
+        
+        Returns:
+            Names of the indices that were warmed
+        """
+        await self.initialize()
+        if self.use_flat_index:
+            await self.get_flat_index()
+        
+        def _warm() -> List[str]:
+            names = []
+            for index in self.table.list_indices():
+                try:
+                    self.table.prewarm_index(index.name)
+                    names.append(index.name)
+                except Exception as e:
+                    print(f"Could not prewarm index {index.name}: {e}")
+            return names
+        
+        return await self._run(_warm)
+    
+    def _open_table(self):
+        """Connect to LanceDB and open or create the chunks table (blocking)."""
+        # Create database directory if it doesn't exist
+        os.makedirs(self.db_path, exist_ok=True)
+        
+        # Connect to LanceDB; writes from other processes become visible after the interval
+        self.db = lancedb.connect(
+            self.db_path,
+            read_consistency_interval=timedelta(seconds=self.config.database.read_consistency_interval_s)
+        )
+        
+        # Check if table exists, create if not
+        if self.table_name in self.db.table_names():
+            self.table = self.db.open_table(self.table_name)
+            print(f"Opened existing table: {self.table_name}")
             
+            self._migrate_schema()
+        else:
+            # Create empty table with schema
+            self.table = self.db.create_table(self.table_name, schema=CodeChunk)
+            print(f"Created new table: {self.table_name}")
+        
+        self.repo_table = self.db.create_table(self.repo_table_name, schema=RepositoryRecord, exist_ok=True)
+    
+    def _migrate_schema(self):
+        """
+        Add the chunk columns a table created by an older version lacks (blocking).
+        
+        Metadata columns are filled with their defaults (empty strings, zero)
+        until the files are re-indexed; a table missing any other column
+        cannot be upgraded in place.
+        """
+        schema = CodeChunk.to_arrow_schema()
+        missing = [field for field in schema if field.name not in self.table.schema.names]
+        if not missing:
+            return
+        
+        not_migratable = [field.name for field in missing if field.name not in MIGRATION_DEFAULTS]
+        if not_migratable:
+            raise RuntimeError(
+                f"Table {self.table_name} in {self.db_path} is missing columns {sorted(not_migratable)} and "
+                f"cannot be upgraded; delete {self.db_path} and run `qwen-rag index` again"
+            )
+        
+        self.table.add_columns({field.name: MIGRATION_DEFAULTS[field.name] for field in missing})
+        print(f"Added columns {[field.name for field in missing]} to table {self.table_name}; "
+              f"re-index with --force to fill in their values")
+    
+    async def add_chunks(self, chunks: List[ChunkWithLocation], embeddings: List[List[float]], repository_path: str,
+                         file_paths: Optional[List[str]] = None, update_embeddings: bool = False):
+        """
+        Upsert code chunks with their embeddings into the database.
+        
+        Rows are merged on ``id``: new chunks are inserted, chunks whose location
+        moved are updated, and rows of ``file_paths`` that are no longer produced
+        are deleted. Unchanged rows are left untouched, keeping their fragments
+        and index entries.
+        
+        Args:
+            chunks: Chunks to write
+            embeddings: Embedding for each chunk
+            repository_path: Repository the chunks belong to
+            file_paths: Relative paths whose rows are replaced by ``chunks``
+                (defaults to the files the chunks come from)
+            update_embeddings: Rewrite every matched row, e.g. after the embedding
+                model changed (by default only rows whose location moved are updated)
+        """
         if len(chunks) != len(embeddings):
             raise ValueError("Number of chunks must match number of embeddings")
         
+        if file_paths is None:
+            file_paths = sorted({chunk.file_path for chunk in chunks})
+        if not file_paths:
+            return
+        
         try:
-            # Convert chunks to CodeChunk models
-            code_chunks = []
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                file_ext = Path(chunk.file_path).suffix
-                
-                # Determine chunk type based on content
-                chunk_type = self._determine_chunk_type(chunk.content)
-                
-                # Create unique ID
-                chunk_id = f"{repository_path}:{chunk.file_path}:{chunk.start_line}:{chunk.end_line}:{i}"
+            # Convert chunks to CodeChunk models, dropping duplicate IDs
+            code_chunks = {}
+            for chunk, embedding, chunk_id in zip(chunks, embeddings, compute_chunk_ids(repository_path, chunks)):
+                if chunk_id in code_chunks:
+                    continue
                 
-                code_chunk = CodeChunk(
+                code_chunks[chunk_id] = CodeChunk(
                     id=chunk_id,
                     content=chunk.content,
                     file_path=chunk.file_path,
@@ -110,79 +401,263 @@ class DatabaseManager:
                     end_line=chunk.end_line,
                     start_char=chunk.start_char,
                     end_char=chunk.end_char,
-                    file_extension=file_ext,
+                    file_extension=Path(chunk.file_path).suffix,
                     repository_path=repository_path,
-                    chunk_type=chunk_type,
+                    chunk_type=chunk.symbol_kind or "text",
+                    symbol_path=chunk.symbol_path,
+                    symbol_name=chunk.symbol_name,
+                    symbol_kind=chunk.symbol_kind,
+                    language=chunk.language,
+                    node_type=chunk.node_type,
+                    parent_symbol=chunk.parent_symbol,
+                    depth=chunk.depth,
+                    content_hash=compute_content_hash(chunk.content),
                     embedding=embedding
                 )
-                code_chunks.append(code_chunk)
             
-            # Add to database
-            self.table.add(code_chunks)
-            print(f"Added {len(code_chunks)} chunks to database")
+            scope = f"repository_path = {_quote(repository_path)} AND file_path IN {_in_list(file_paths)}"
+            
+            if not code_chunks:
+                await self._run(self.table.delete, scope)
+                return
+            
+            # Merge into the table keyed on the stable chunk ID
+            moved = ("target.start_line != source.start_line OR target.end_line != source.end_line "
+                     "OR target.start_char != source.start_char OR target.end_char != source.end_char")
+            merge = (
+                self.table.merge_insert("id")
+                .when_matched_update_all(where=None if update_embeddings else moved)
+                .when_not_matched_insert_all()
+                .when_not_matched_by_source_delete(scope)
+            )
+            await self._run(merge.execute, list(code_chunks.values()))
+            print(f"Upserted {len(code_chunks)} chunks to database")
             
         except Exception as e:
             print(f"Error adding chunks to database: {e}")
             raise
     
-    def _determine_chunk_type(self, content: str) -> str:
-        """Determine the type of code chunk based on its content."""
-        content_lower = content.lower().strip()
+    async def get_embeddings_by_ids(self, chunk_ids: List[str]) -> Dict[str, List[float]]:
+        """Get stored embeddings for the given chunk IDs that already exist."""
+        if not chunk_ids:
+            return {}
+        
+        try:
+            if not self.table:
+                await self.initialize()
+            
+            query = (
+                self.table.search()
+                .where(f"id IN {_in_list(chunk_ids)}")
+                .select(["id", "embedding"])
+                .limit(len(chunk_ids))
+            )
+            rows = await self._run(query.to_list)
+            
+            return {row["id"]: row["embedding"] for row in rows}
+            
+        except Exception as e:
+            print(f"Error retrieving embeddings: {e}")
+            return {}
+    
+    async def prune_repository_files(self, repository_path: str, keep_file_paths: List[str]):
+        """Delete chunks of a repository whose files are not in ``keep_file_paths``."""
+        try:
+            if not self.table:
+                await self.initialize()
+            
+            condition = f"repository_path = {_quote(repository_path)}"
+            if keep_file_paths:
+                condition += f" AND file_path NOT IN {_in_list(keep_file_paths)}"
+            await self._run(self.table.delete, condition)
+            
+        except Exception as e:
+            print(f"Error pruning repository {repository_path}: {e}")
+            raise
+    
+    async def search_similar(self, query_embedding: List[float], top_k: int = 20,
+                             where: Optional[str] = None, nprobes: Optional[int] = None) -> List[ScoredChunk]:
+        """
+        Search for similar code chunks using vector similarity.
         
-        # Function patterns
-        if any(pattern in content_lower for pattern in ['def ', 'function ', 'func ', 'fn ']):
-            return "function"
+        Args:
+            query_embedding: Query vector
+            top_k: Number of chunks to return
+            where: Optional SQL filter applied before the vector search
+            nprobes: Partitions to probe (defaults to ``database.nprobes``)
+            
+        Returns:
+            Chunks with their vector distance, closest first
+        """
+        try:
+            if not self.table:
+                await self.initialize()
+            
+            # The flat index handles the column filters build_filter produces
+            filters = parse_filter(where) if self.use_flat_index else None
+            if filters is not None:
+                return await self._flat_batcher.submit((query_embedding, top_k, filters))
+            
+            # Perform vector search
+            query = (
+                self.table.search(query_embedding)
+                .distance_type(self.config.database.distance_type)
+                .nprobes(nprobes or self.config.database.nprobes)
+                .limit(top_k)
+            )
+            if where:
+                query = query.where(where, prefilter=True)
+            return _to_scored_chunks(await self._run(query.to_list), "_distance")
+            
+        except Exception as e:
+            print(f"Error searching database: {e}")
+            return []
+    
+    async def get_flat_index(self) -> FlatIndex:
+        """
+        Get the published flat index snapshot, swapping to a newer one if available.
         
-        # Class patterns
-        if any(pattern in content_lower for pattern in ['class ', 'struct ', 'interface ']):
-            return "class"
+        The CURRENT pointer is re-read at most once per
+        ``read_consistency_interval_s``, so every process serving searches
+        picks up a snapshot the indexer publishes within that interval. A
+        snapshot is only built here if none has been published yet.
+        """
+        interval = self.config.database.read_consistency_interval_s
+        if self.flat_index is not None and time.monotonic() - self._flat_checked_at < interval:
+            return self.flat_index
         
-        # Method patterns (inside classes)
-        if any(pattern in content_lower for pattern in ['    def ', '  def ', '\tdef ']):
-            return "method"
+        if self._flat_lock is None:
+            self._flat_lock = asyncio.Lock()
+        async with self._flat_lock:
+            if self.flat_index is not None and time.monotonic() - self._flat_checked_at < interval:
+                return self.flat_index
+            
+            path = await self._run(current_snapshot, self.flat_index_path)
+            if path is None:
+                await self.publish_flat_index()
+            elif self.flat_index is None or self.flat_index.path != path:
+                index = await self._run(FlatIndex.load, path)
+                if index is None:
+                    raise RuntimeError(f"Flat index snapshot {path} is incomplete")
+                self.flat_index = index
+                print(f"Loaded flat index snapshot {os.path.basename(path)} ({len(index)} vectors)")
+            self._flat_checked_at = time.monotonic()
+        return self.flat_index
+    
+    async def publish_flat_index(self) -> FlatIndex:
+        """Write a flat index snapshot of the current table version and make it current."""
+        await self.initialize()
+        path = await self._run(self._write_flat_snapshot)
+        index = await self._run(FlatIndex.load, path)
+        print(f"Published flat index snapshot {os.path.basename(path)} ({len(index)} vectors)")
+        self.flat_index = index
+        self._flat_checked_at = time.monotonic()
+        return index
+    
+    def _write_flat_snapshot(self) -> str:
+        """Stream the table into a new flat index snapshot and publish it (blocking)."""
+        version = self.table.version
+        rows = self.table.count_rows()
+        dim = self.table.schema.field("embedding").type.list_size
+        query = self.table.search().select(["embedding", *SNAPSHOT_COLUMNS]).limit(None)
         
-        # Import patterns
-        if any(pattern in content_lower for pattern in ['import ', 'from ', '#include', 'using ']):
-            return "import"
+        def _batches():
+            for batch in query.to_batches():
+                embeddings = batch.column("embedding").flatten().to_numpy(zero_copy_only=False)
+                yield (
+                    batch.column("id").to_pylist(),
+                    embeddings.reshape(len(batch), dim),
+                    {column: batch.column(column).to_pylist() for column in SNAPSHOT_COLUMNS}
+                )
         
-        # Comment patterns
-        if content_lower.startswith('#') or content_lower.startswith('//') or content_lower.startswith('/*'):
-            return "comment"
+        return publish_snapshot(self.flat_index_path, _batches(), rows, dim, version,
+                                dtype=self.config.database.flat_index_dtype)
+    
+    async def _search_flat_batch(self, items: List[tuple]) -> List[List[ScoredChunk]]:
+        """Answer (embedding, top_k, filters) searches with one pass over the flat index."""
+        index = await self.get_flat_index()
         
-        return "code"
+        def _search():
+            top_k = max(k for _, k, _ in items)
+            results = index.search(
+                [embedding for embedding, _, _ in items], top_k,
+                [index.mask(filters) for _, _, filters in items]
+            )
+            return [
+                [ScoredChunk(CodeChunk(**index.row(row)), distance) for row, distance in hits[:k]]
+                for hits, (_, k, _) in zip(results, items)
+            ]
+        
+        return await self._run(_search)
     
-    async def search_similar(self, query_embedding: List[float], top_k: int = 20) -> List[CodeChunk]:
-        """Search for similar code chunks using vector similarity."""
+    async def search_fulltext(self, query_text: str, top_k: int = 20,
+                              where: Optional[str] = None) -> List[ScoredChunk]:
+        """
+        Search chunks with BM25 over content and symbol paths.
+        
+        Requires the full-text indices created by ``optimize``; returns an empty
+        list if they are missing or the query cannot be parsed.
+        
+        Returns:
+            Chunks with their BM25 score, best first
+        """
         try:
             if not self.table:
                 await self.initialize()
             
-            # Perform vector search
-            results = (
-                self.table.search(query_embedding)
+            query = (
+                self.table.search(query_text, query_type="fts", fts_columns=FULL_TEXT_COLUMNS)
                 .limit(top_k)
-                .to_pydantic(CodeChunk)
             )
+            if where:
+                query = query.where(where, prefilter=True)
+            return _to_scored_chunks(await self._run(query.to_list), "_score")
             
-            return results
+        except Exception as e:
+            print(f"Error in full-text search: {e}")
+            return []
+    
+    async def get_chunks_by_ids(self, chunk_ids: List[str], where: Optional[str] = None) -> List[CodeChunk]:
+        """Get chunks by ID (optionally filtered), in the order of ``chunk_ids``."""
+        if not chunk_ids:
+            return []
+        
+        try:
+            if not self.table:
+                await self.initialize()
+            
+            condition = f"id IN {_in_list(chunk_ids)}"
+            if where:
+                condition += f" AND {where}"
+            query = self.table.search().where(condition).limit(len(chunk_ids))
+            chunks = {chunk.id: chunk for chunk in await self._run(query.to_pydantic, CodeChunk)}
+            return [chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in chunks]
             
         except Exception as e:
-            print(f"Error searching database: {e}")
+            print(f"Error retrieving chunks by id: {e}")
             return []
     
+    async def get_symbol_rows(self) -> Dict[str, List[str]]:
+        """
+        Get the symbol columns of all named chunks.
+        
+        Returns:
+            Column name -> values for id, symbol_name, symbol_path, symbol_kind and language
+        """
+        await self.initialize()
+        columns = ["id", "symbol_name", "symbol_path", "symbol_kind", "language"]
+        query = self.table.search().where("symbol_name != ''").select(columns).limit(None)
+        table = await self._run(query.to_arrow)
+        return {column: table[column].to_pylist() for column in columns}
+    
     async def get_chunks_by_file(self, file_path: str) -> List[CodeChunk]:
         """Get all chunks for a specific file."""
         try:
             if not self.table:
                 await self.initialize()
             
-            results = (
-                self.table.search()
-                .where(f"file_path = '{file_path}'")
-                .to_pydantic(CodeChunk)
-            )
-            
-            return results
+            query = self.table.search().where(f"file_path = {_quote(file_path)}")
+            return await self._run(query.to_pydantic, CodeChunk)
             
         except Exception as e:
             print(f"Error retrieving chunks for file {file_path}: {e}")
@@ -194,27 +669,65 @@ class DatabaseManager:
             if not self.table:
                 await self.initialize()
             
-            results = (
-                self.table.search()
-                .where(f"repository_path = '{repository_path}'")
-                .to_pydantic(CodeChunk)
-            )
-            
-            return results
+            query = self.table.search().where(f"repository_path = {_quote(repository_path)}")
+            return await self._run(query.to_pydantic, CodeChunk)
             
         except Exception as e:
             print(f"Error retrieving chunks for repository {repository_path}: {e}")
             return []
     
-    async def delete_repository(self, repository_path: str):
-        """Delete all chunks for a specific repository."""
+    async def count_rows(self, where: Optional[str] = None) -> int:
+        """Count rows matching an optional SQL filter without materializing them."""
+        await self.initialize()
+        return await self._run(self.table.count_rows, where)
+    
+    async def exists(self, where: str) -> bool:
+        """Check whether any row matches a SQL filter."""
+        await self.initialize()
+        query = self.table.search().where(where).select(["id"]).limit(1)
+        return len(await self._run(query.to_list)) > 0
+    
+    async def count_repository_chunks(self, repository_path: str) -> int:
+        """Count the chunks stored for a repository."""
+        return await self.count_rows(f"repository_path = {_quote(repository_path)}")
+    
+    async def upsert_repository_record(self, record: RepositoryRecord):
+        """Insert or replace the metadata record of a repository."""
+        await self.initialize()
+        merge = (
+            self.repo_table.merge_insert("repository_path")
+            .when_matched_update_all()
+            .when_not_matched_insert_all()
+        )
+        await self._run(merge.execute, [record])
+    
+    async def get_repository_record(self, repository_path: str) -> Optional[RepositoryRecord]:
+        """Get the metadata record of a repository, if it has been indexed."""
+        await self.initialize()
+        query = self.repo_table.search().where(f"repository_path = {_quote(repository_path)}").limit(1)
+        records = await self._run(query.to_pydantic, RepositoryRecord)
+        return records[0] if records else None
+    
+    async def list_repository_records(self) -> List[RepositoryRecord]:
+        """Get the metadata records of all indexed repositories."""
+        await self.initialize()
+        return await self._run(self.repo_table.search().limit(None).to_pydantic, RepositoryRecord)
+    
+    async def delete_repository(self, repository_path: str) -> int:
+        """Delete all chunks for a specific repository and return how many were removed."""
         try:
             if not self.table:
                 await self.initialize()
             
             # Delete rows matching the repository path
-            self.table.delete(f"repository_path = '{repository_path}'")
+            condition = f"repository_path = {_quote(repository_path)}"
+            deleted_count = await self._run(self.table.count_rows, condition)
+            await self._run(self.table.delete, condition)
+            await self._run(self.repo_table.delete, condition)
             print(f"Deleted chunks for repository: {repository_path}")
+            if self.use_flat_index:
+                await self.publish_flat_index()
+            return deleted_count
             
         except Exception as e:
             print(f"Error deleting repository {repository_path}: {e}")
@@ -227,37 +740,137 @@ class DatabaseManager:
                 await self.initialize()
             
             # Get basic stats
-            total_chunks = self.table.count_rows()
+            total_chunks = await self._run(self.table.count_rows)
             
-            # Get repository counts
-            all_chunks = self.table.search().to_pydantic(CodeChunk)
-            repo_counts = {}
-            file_type_counts = {}
-            chunk_type_counts = {}
+            # Repository counts come from the per-repository metadata records
+            records = await self.list_repository_records()
+            repo_counts = {record.repository_path: record.chunk_count for record in records}
             
-            for chunk in all_chunks:
-                # Repository counts
-                repo_counts[chunk.repository_path] = repo_counts.get(chunk.repository_path, 0) + 1
-                
-                # File type counts
-                file_type_counts[chunk.file_extension] = file_type_counts.get(chunk.file_extension, 0) + 1
-                
-                # Chunk type counts
-                chunk_type_counts[chunk.chunk_type] = chunk_type_counts.get(chunk.chunk_type, 0) + 1
+            # Type breakdowns only read the two small columns they need
+            query = self.table.search().select(["file_extension", "chunk_type"]).limit(None)
+            columns = await self._run(query.to_arrow)
+            file_type_counts = _value_counts(columns["file_extension"])
+            chunk_type_counts = _value_counts(columns["chunk_type"])
             
-            return {
+            stats = {
                 "total_chunks": total_chunks,
                 "repositories": len(repo_counts),
                 "repository_counts": repo_counts,
                 "file_type_counts": file_type_counts,
-                "chunk_type_counts": chunk_type_counts
+                "chunk_type_counts": chunk_type_counts,
+                "repository_records": [record.model_dump() for record in records]
             }
+            if self.use_flat_index:
+                snapshot = await self._run(current_snapshot, self.flat_index_path)
+                stats["flat_index_snapshot"] = os.path.basename(snapshot) if snapshot else None
+            return stats
             
         except Exception as e:
             print(f"Error getting database stats: {e}")
             return {"error": str(e)}
     
+    async def optimize(self, target_rows_per_fragment: Optional[int] = None,
+                       retention_hours: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Compact fragments, clean up old versions and bring indexes up to date.
+        
+        Every indexer batch appends a small fragment and a new dataset version;
+        this merges them back into large fragments so scans stay fast.
+        
+        Args:
+            target_rows_per_fragment: Target fragment size for compaction
+            retention_hours: Keep versions newer than this many hours
+            
+        Returns:
+            Report with ``before``/``after`` fragment, byte and version counts
+        """
+        db_config = self.config.database
+        if target_rows_per_fragment is None:
+            target_rows_per_fragment = db_config.target_rows_per_fragment
+        if retention_hours is None:
+            retention_hours = db_config.version_retention_hours
+        
+        await self.initialize()
+        
+        def _table_stats() -> Dict[str, int]:
+            stats = self.table.stats()
+            return {
+                "fragments": stats["fragment_stats"]["num_fragments"],
+                "small_fragments": stats["fragment_stats"]["num_small_fragments"],
+                "bytes": stats["total_bytes"],
+                "versions": len(self.table.list_versions()),
+                "rows": stats["num_rows"],
+            }
+        
+        def _optimize() -> List[str]:
+            actions = []
+            
+            # Compaction to an explicit target size needs the pylance package;
+            # otherwise optimize() below compacts with Lance's default target.
+            try:
+                self.table.compact_files(target_rows_per_fragment=target_rows_per_fragment)
+                actions.append(f"compacted to {target_rows_per_fragment} rows/fragment")
+            except ImportError:
+                actions.append("compacted with default fragment size (pylance not installed)")
+            
+            actions.extend(self._ensure_indices())
+            
+            # Compacts, prunes versions past retention and adds new rows to existing indices
+            self.table.optimize(cleanup_older_than=timedelta(hours=retention_hours))
+            self.repo_table.optimize(cleanup_older_than=timedelta(hours=retention_hours))
+            actions.append(f"cleaned up versions older than {retention_hours:g}h and optimized indices")
+            return actions
+        
+        try:
+            before = await self._run(_table_stats)
+            actions = await self._run(_optimize)
+            after = await self._run(_table_stats)
+            return {"before": before, "after": after, "actions": actions}
+            
+        except Exception as e:
+            print(f"Error optimizing table: {e}")
+            raise
+    
+    def _ensure_indices(self) -> List[str]:
+        """Create the scalar and vector indices the table is missing (blocking)."""
+        db_config = self.config.database
+        created = []
+        indexed_columns = {
+            column for index in self.table.list_indices() for column in index.columns
+        }
+        
+        if "id" not in indexed_columns:
+            self.table.create_scalar_index("id", index_type="BTREE")
+            created.append("created scalar index on id")
+        
+        for column in FILTER_COLUMNS:
+            if column not in indexed_columns:
+                self.table.create_scalar_index(column, index_type="BITMAP")
+                created.append(f"created bitmap index on {column}")
+        
+        for column in FULL_TEXT_COLUMNS:
+            if column not in indexed_columns:
+                # Code identifiers should match verbatim: no stemming or stop words
+                self.table.create_fts_index(
+                    column, use_tantivy=False, stem=False, remove_stop_words=False
+                )
+                created.append(f"created full-text index on {column}")
+        
+        if "embedding" not in indexed_columns and self.table.count_rows() >= db_config.vector_index_min_rows:
+            self.table.create_index(
+                metric=db_config.distance_type,
+                vector_column_name="embedding",
+                index_type="IVF_PQ"
+            )
+            created.append("created IVF_PQ vector index")
+        
+        return created
+    
     async def close(self):
         """Close database connections."""
-        # LanceDB connections don't need explicit closing
-        pass 
\ No newline at end of file
+        # LanceDB connections don't need explicit closing; just stop the I/O threads
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self.db = None
+        self.table = None 
\ No newline at end of file
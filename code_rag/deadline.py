@@ -0,0 +1,39 @@
+"""Per-query time budgets."""
+
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """
+    A point in time by which a query should finish.
+
+    A deadline without a budget never expires, so stages can always be
+    run through it whether or not the caller set a latency budget.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = budget_ms
+        self._expires_at = None if budget_ms is None else time.monotonic() + budget_ms / 1000
+
+    @property
+    def unlimited(self) -> bool:
+        return self._expires_at is None
+
+    def remaining_ms(self) -> float:
+        """Milliseconds left (infinite without a budget, never negative)."""
+        if self._expires_at is None:
+            return float("inf")
+        return max(0.0, (self._expires_at - time.monotonic()) * 1000)
+
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """Await a stage, raising ``asyncio.TimeoutError`` if the deadline passes first."""
+        if self._expires_at is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, self.remaining_ms() / 1000)
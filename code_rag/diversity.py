@@ -0,0 +1,89 @@
+"""Near-duplicate removal and maximal marginal relevance over candidate embeddings."""
+
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .cascade import Candidate
+from .flat_index import normalize_rows
+
+
+def similarity_matrix(embeddings: Sequence[Sequence[float]]) -> np.ndarray:
+    """Pairwise cosine similarities of a set of embeddings."""
+    vectors = normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    return vectors @ vectors.T
+
+
+def drop_near_duplicates(similarities: np.ndarray, order: Sequence[int], threshold: float) -> List[int]:
+    """
+    Walk ``order`` best first, keeping items that are not near-duplicates.
+
+    An item is dropped when its similarity to an already kept item is at
+    least ``threshold``.
+
+    Returns:
+        Indices of the kept items, in ``order``
+    """
+    kept: List[int] = []
+    for i in order:
+        if kept and similarities[i, kept].max() >= threshold:
+            continue
+        kept.append(int(i))
+    return kept
+
+
+def mmr_order(similarities: np.ndarray, relevance: np.ndarray, mmr_lambda: float) -> List[int]:
+    """
+    Order items by maximal marginal relevance.
+
+    Each step picks the item maximizing
+    ``mmr_lambda * relevance - (1 - mmr_lambda) * max similarity to the items picked so far``,
+    so ``mmr_lambda=1`` is plain relevance order and lower values favour
+    items unlike the ones already ranked.
+    """
+    count = len(relevance)
+    picked: List[int] = []
+    remaining = np.ones(count, dtype=bool)
+    # Dissimilar items (negative cosine) are not rewarded, only similar ones penalized
+    max_similarity = np.zeros(count, dtype=np.float32)
+
+    for _ in range(count):
+        scores = mmr_lambda * relevance - (1.0 - mmr_lambda) * max_similarity
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        remaining[best] = False
+        np.maximum(max_similarity, similarities[:, best], out=max_similarity)
+    return picked
+
+
+def diversify_candidates(candidates: List[Candidate], duplicate_threshold: float,
+                         mmr_lambda: float) -> Tuple[List[Candidate], int]:
+    """
+    Drop near-duplicate candidates and order the rest by maximal marginal relevance.
+
+    Relevance is the first-stage ``cheap_score``; of a group of near-identical
+    chunks (vendored or copy-pasted code) only the best scoring one is kept.
+
+    Returns:
+        The diversified candidates and the number of duplicates dropped
+    """
+    if len(candidates) < 2:
+        return candidates, 0
+
+    similarities = similarity_matrix([candidate.chunk.embedding for candidate in candidates])
+    relevance = np.array([candidate.cheap_score for candidate in candidates], dtype=np.float32)
+
+    kept = drop_near_duplicates(similarities, np.argsort(-relevance, kind="stable"), duplicate_threshold)
+    order = mmr_order(similarities[np.ix_(kept, kept)], relevance[kept], mmr_lambda)
+    return [candidates[kept[i]] for i in order], len(candidates) - len(kept)
+
+
+def mmr_rank(candidates: List[Candidate], relevance: Sequence[float], mmr_lambda: float) -> List[Candidate]:
+    """Order candidates by maximal marginal relevance under the given relevance scores."""
+    if len(candidates) < 2:
+        return list(candidates)
+
+    similarities = similarity_matrix([candidate.chunk.embedding for candidate in candidates])
+    order = mmr_order(similarities, np.asarray(relevance, dtype=np.float32), mmr_lambda)
+    return [candidates[i] for i in order]
@@ -1,16 +1,48 @@
 """Embedding service using OpenAI-compatible API."""
 
 import asyncio
-from typing import List, Dict, Any, Optional
+import hashlib
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple
 import openai
 from openai import AsyncOpenAI
 
 from .config import CodeRAGConfig
 from .client import ExtendedOpenaiClient
+from .batching import MicroBatcher
+from .cache import EmbeddingCache, LRUCache, make_cache_key, normalize_query
+from .circuit_breaker import CircuitBreaker
+from .packing import pack_documents, trim_to_tokens
+from .tree_sitter_utils import estimate_token_count
+
+
+# Instruction prepended to embedded texts, as recommended by Qwen3-Embedding
+EMBEDDING_INSTRUCTION = "Retrieve relevant code snippets for the given query"
+
+# Task instruction for the Qwen3-Reranker
+RERANK_INSTRUCTION = "Given a web search query, retrieve relevant passages that answer the query"
+
+# Tokens the reranker prompt template adds to each (query, document) pair
+RERANK_PAIR_OVERHEAD_TOKENS = estimate_token_count(RERANK_INSTRUCTION) + 32
+
+
+@dataclass
+class RerankUsage:
+    """Reranker work done for one query: requests sent and estimated tokens."""
+    calls: int = 0
+    documents: int = 0
+    tokens: int = 0
+    cached: int = 0  # documents answered from the score cache
 
 
 class EmbeddingService:
-    """Service for generating embeddings using OpenAI-compatible API."""
+    """
+    Service for generating embeddings using OpenAI-compatible API.
+    
+    Concurrent ``embed_text`` calls that miss the query cache are coalesced:
+    queries arriving within ``api.query_batch_window_ms`` are sent as one
+    request of up to ``api.query_batch_size`` inputs.
+    """
     
     def __init__(self, config: CodeRAGConfig):
         self.config = config
@@ -19,6 +51,15 @@ class EmbeddingService:
             api_key=config.api.api_key,
             timeout=config.api.timeout
         )
+        self.query_cache = EmbeddingCache(
+            max_size=config.cache.query_embedding_cache_size,
+            path=config.cache.query_embedding_cache_path
+        )
+        self.query_batcher = MicroBatcher(
+            self._embed_distinct,
+            window_ms=config.api.query_batch_window_ms,
+            max_batch=config.api.query_batch_size
+        )
         
     async def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts."""
@@ -45,10 +86,87 @@ class EmbeddingService:
             print(f"Error generating embeddings: {e}")
             raise
     
-    async def embed_text(self, text: str) -> List[float]:
-        """Generate embedding for a single text."""
-        embeddings = await self.embed_texts([text])
-        return embeddings[0] if embeddings else []
+    async def embed_text(self, text: str, cache_hits: Optional[Dict[str, int]] = None) -> List[float]:
+        """
+        Generate embedding for a single query text.
+        
+        Results are cached by (model, instruction, normalized text), so repeated
+        queries skip the network entirely. A cache hit is counted in
+        ``cache_hits["query_embedding"]`` when a dict is given.
+        """
+        key = EmbeddingCache.make_key(self.config.api.embedding_model, EMBEDDING_INSTRUCTION, text)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            if cache_hits is not None:
+                cache_hits["query_embedding"] = cache_hits.get("query_embedding", 0) + 1
+            return cached
+        
+        if self.config.api.query_batch_window_ms > 0:
+            embedding = await self.query_batcher.submit(text)
+        else:
+            embeddings = await self.embed_texts([text])
+            if not embeddings:
+                return []
+            embedding = embeddings[0]
+        
+        self.query_cache.put(key, embedding)
+        return embedding
+    
+    async def _embed_distinct(self, texts: List[str]) -> List[List[float]]:
+        """Embed a coalesced batch, sending each distinct text once."""
+        distinct = list(dict.fromkeys(texts))
+        embeddings = dict(zip(distinct, await self._embed_batch(distinct)))
+        return [embeddings[text] for text in texts]
+    
+    async def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed many query texts at once.
+        
+        Cached queries are served from the query cache; the remaining distinct
+        queries are sent in concurrent requests of up to ``api.query_batch_size``
+        inputs each, and cached for later.
+        """
+        model = self.config.api.embedding_model
+        keys = [EmbeddingCache.make_key(model, EMBEDDING_INSTRUCTION, text) for text in texts]
+        embeddings: List[Optional[List[float]]] = [self.query_cache.get(key) for key in keys]
+        
+        # Distinct uncached queries, keyed so duplicates are embedded once
+        missing: Dict[str, str] = {}
+        for key, text, embedding in zip(keys, texts, embeddings):
+            if embedding is None:
+                missing.setdefault(key, text)
+        
+        if missing:
+            missing_keys = list(missing)
+            batch_size = max(1, self.config.api.query_batch_size)
+            batches = [missing_keys[i:i + batch_size] for i in range(0, len(missing_keys), batch_size)]
+            results = await asyncio.gather(*[
+                self._embed_batch([missing[key] for key in batch]) for batch in batches
+            ])
+            
+            new_embeddings: Dict[str, List[float]] = {}
+            for batch, batch_embeddings in zip(batches, results):
+                for key, embedding in zip(batch, batch_embeddings):
+                    new_embeddings[key] = embedding
+                    self.query_cache.put(key, embedding)
+            
+            embeddings = [
+                embedding if embedding is not None else new_embeddings[key]
+                for key, embedding in zip(keys, embeddings)
+            ]
+        
+        return embeddings
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Get query embedding cache statistics (size, hits, misses, hit rate) and batching counts."""
+        stats = self.query_cache.stats()
+        stats["embedding_requests"] = self.query_batcher.batches_sent
+        stats["batched_queries"] = self.query_batcher.items_sent
+        return stats
+    
+    async def close(self):
+        """Close the query cache's disk tier."""
+        self.query_cache.close()
     
     async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a batch of texts."""
@@ -56,8 +174,7 @@ class EmbeddingService:
         formatted_texts = []
         for text in texts:
             # Add instruction as recommended by Qwen3-Embedding documentation
-            task_description = "Retrieve relevant code snippets for the given query"
-            formatted_text = f"Instruct: {task_description}\nQuery: {text}"
+            formatted_text = f"Instruct: {EMBEDDING_INSTRUCTION}\nQuery: {text}"
             formatted_texts.append(formatted_text)
         
         response = await self.client.embeddings.create(
@@ -70,7 +187,17 @@ class EmbeddingService:
 
 
 class RerankingService:
-    """Service for reranking search results using OpenAI-compatible API."""
+    """
+    Service for reranking search results using OpenAI-compatible API.
+    
+    Relevance scores are cached per (model, instruction, query, document hash),
+    so only documents not scored before are sent to the reranker. The cache
+    is cleared when the reranking model changes.
+    
+    The rerank endpoint sits behind a circuit breaker: after repeated failures
+    queries go straight to the degraded path (``api.rerank_degraded_mode``)
+    until a health probe succeeds.
+    """
     
     def __init__(self, config: CodeRAGConfig):
         self.config = config
@@ -79,108 +206,245 @@ class RerankingService:
             api_key=config.api.api_key,
             timeout=config.api.timeout
         )
+        self.score_cache = LRUCache(
+            max_size=config.cache.rerank_cache_size,
+            ttl_seconds=config.cache.rerank_cache_ttl_s
+        )
+        self._cache_model = config.api.reranking_model
+        self.breaker = CircuitBreaker(
+            failure_threshold=config.api.rerank_failure_threshold,
+            reset_timeout_s=config.api.rerank_reset_timeout_s,
+            health_check=self._is_healthy
+        )
+    
+    async def _is_healthy(self) -> bool:
+        """Probe the server health endpoint for the circuit breaker."""
+        await self.client.get_health(timeout=self.config.api.rerank_timeout)
+        return True
     
-    async def rerank(self, query: str, documents: List[str], top_k: int = 5) -> List[int]:
+    async def rerank(self, query: str, documents: List[str], top_k: int = 5,
+                     document_hashes: Optional[List[str]] = None) -> List[int]:
         """
         Rerank documents based on relevance to query.
         Returns indices of documents sorted by relevance score.
         """
+        ranked = await self.rerank_with_scores(query, documents, top_k, document_hashes)
+        return [idx for idx, _ in ranked]
+    
+    async def rerank_with_scores(self, query: str, documents: List[str], top_k: int = 5,
+                                 document_hashes: Optional[List[str]] = None,
+                                 usage: Optional[RerankUsage] = None) -> List[Tuple[int, Optional[float]]]:
+        """
+        Score documents against a query, using cached scores where available.
+        
+        Args:
+            query: Search query
+            documents: Documents to rank
+            top_k: Number of results to return
+            document_hashes: Content hashes of the documents (computed if omitted)
+            usage: Accumulates the requests and tokens sent to the reranker
+            
+        Returns:
+            (document index, relevance score) pairs, best first; documents that
+            could not be scored follow in input order with a score of None
+        """
         if not documents:
             return []
-            
+        
+        model = self.config.api.reranking_model
+        if model != self._cache_model:
+            self.score_cache.clear()
+            self._cache_model = model
+        
+        if document_hashes is None:
+            document_hashes = [hashlib.sha1(doc.encode("utf-8")).hexdigest() for doc in documents]
+        
+        normalized_query = normalize_query(query)
+        keys = [
+            make_cache_key(model, RERANK_INSTRUCTION, normalized_query, doc_hash)
+            for doc_hash in document_hashes
+        ]
+        
+        scores: List[Optional[float]] = [self.score_cache.get(key) for key in keys]
+        uncached = [i for i, score in enumerate(scores) if score is None]
+        if usage is not None:
+            usage.cached += len(documents) - len(uncached)
+        
+        if uncached:
+            new_scores = await self._score_documents(query, [documents[i] for i in uncached], usage)
+            for i, score in zip(uncached, new_scores):
+                scores[i] = score
+                # Failed scores are left uncached so they are retried next time
+                if score is not None:
+                    self.score_cache.put(keys[i], score)
+        
+        ranked: List[Tuple[int, Optional[float]]] = sorted(
+            ((i, score) for i, score in enumerate(scores) if score is not None),
+            key=lambda item: (-item[1], item[0])
+        )
+        ranked.extend((i, None) for i, score in enumerate(scores) if score is None)
+        return ranked[:top_k]
+    
+    async def _score_documents(self, query: str, documents: List[str],
+                               usage: Optional[RerankUsage] = None) -> List[Optional[float]]:
+        """
+        Score documents with the rerank endpoint, or the degraded path if it is unavailable.
+        
+        Documents are trimmed and packed into requests that fit
+        ``reranking_max_tokens``; multiple requests run concurrently, at most
+        ``rerank_max_concurrent_requests`` at a time.
+        """
+        if not await self.breaker.allow_request():
+            return await self._degraded_scores(query, documents, usage)
+        
+        api = self.config.api
+        batches = pack_documents(
+            query, documents,
+            max_tokens=api.reranking_max_tokens,
+            doc_max_tokens=api.reranking_doc_max_tokens,
+            pair_overhead_tokens=RERANK_PAIR_OVERHEAD_TOKENS
+        )
+        if usage is not None:
+            usage.calls += len(batches)
+            usage.documents += len(documents)
+            usage.tokens += sum(batch.tokens for batch in batches)
+        
+        semaphore = asyncio.Semaphore(max(1, api.rerank_max_concurrent_requests))
         try:
+            results = await asyncio.gather(
+                *[self._rerank_batch(query, batch.documents, semaphore) for batch in batches],
+                return_exceptions=True
+            )
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. its deadline passed); that says nothing about the endpoint
+            self.breaker.record_cancelled()
+            raise
+        
+        scores: List[Optional[float]] = [None] * len(documents)
+        failed: List[int] = []
+        for batch, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                print(f"Error during reranking: {result}")
+                failed.extend(batch.indices)
+                continue
+            for i, score in zip(batch.indices, result):
+                scores[i] = score
+        
+        if not failed:
+            self.breaker.record_success()
+            return scores
+        
+        self.breaker.record_failure()
+        degraded = await self._degraded_scores(query, [documents[i] for i in failed], usage)
+        for i, score in zip(failed, degraded):
+            scores[i] = score
+        return scores
+    
+    async def _rerank_batch(self, query: str, documents: List[str],
+                            semaphore: asyncio.Semaphore) -> List[Optional[float]]:
+        """Score one packed batch of documents with a single rerank request."""
+        async with semaphore:
             # Use the new rerank method from ExtendedOpenaiClient
             result = await self.client.rerank(
                 model=self.config.api.reranking_model,
                 query=query,
                 documents=documents,
-                instruction="Given a web search query, retrieve relevant passages that answer the query",
-                top_k=top_k,
-                return_documents=False
+                instruction=RERANK_INSTRUCTION,
+                top_k=None,
+                return_documents=False,
+                timeout=self.config.api.rerank_timeout
             )
-            
-            # Extract indices from the result
-            if 'results' in result:
-                return [item['index'] for item in result['results']]
-            else:
-                # Fallback to original order
-                return list(range(min(top_k, len(documents))))
-            
-        except Exception as e:
-            print(f"Error during reranking: {e}")
-            # Fallback to original order with custom reranking
-            return await self._fallback_rerank(query, documents, top_k)
+        
+        # Extract per-document scores from the result
+        if 'results' not in result:
+            return [None] * len(documents)
+        
+        scores: List[Optional[float]] = [None] * len(documents)
+        for rank, item in enumerate(result['results']):
+            score = item.get('relevance_score')
+            if score is None:
+                # No score reported: derive one from the returned order
+                score = 1.0 - rank / len(result['results'])
+            scores[item['index']] = float(score)
+        return scores
     
-    async def _fallback_rerank(self, query: str, documents: List[str], top_k: int) -> List[int]:
-        """
-        Fallback reranking method when the main rerank API fails.
-        Returns indices of documents sorted by relevance score.
+    async def _degraded_scores(self, query: str, documents: List[str],
+                               usage: Optional[RerankUsage] = None) -> List[Optional[float]]:
+        """Score documents without the rerank endpoint, per ``api.rerank_degraded_mode``."""
+        if self.config.api.rerank_degraded_mode == "fallback":
+            if usage is not None:
+                # One chat completion per document
+                usage.calls += len(documents)
+                usage.documents += len(documents)
+                usage.tokens += sum(
+                    estimate_token_count(self._format_reranking_prompt(RERANK_INSTRUCTION, query, doc))
+                    for doc in documents
+                )
+            return await self._fallback_scores(query, documents)
+        # "none": leave documents unscored; the search keeps their first-stage ranking
+        return [None] * len(documents)
+    
+    async def _fallback_scores(self, query: str, documents: List[str]) -> List[Optional[float]]:
         """
-        try:
-            # Create reranking prompts
-            scores = []
-            
-            # Process documents in batches for efficiency
-            batch_size = 5
-            for i in range(0, len(documents), batch_size):
-                batch_docs = documents[i:i + batch_size]
-                batch_indices = list(range(i, min(i + batch_size, len(documents))))
-                
-                batch_scores = await self._rerank_batch(query, batch_docs, batch_indices)
-                scores.extend(batch_scores)
-                
-                # Small delay between batches
-                if i + batch_size < len(documents):
-                    await asyncio.sleep(0.1)
-            
-            # Sort by score (descending) and return top_k indices
-            scores.sort(key=lambda x: x[1], reverse=True)
-            return [idx for idx, score in scores[:top_k]]
-            
-        except Exception as e:
-            print(f"Error during fallback reranking: {e}")
-            # Final fallback to original order
-            return list(range(min(top_k, len(documents))))
-
-    async def _rerank_batch(self, query: str, documents: List[str], indices: List[int]) -> List[tuple]:
-        """Rerank a batch of documents."""
-        results = []
+        Fallback scoring method when the main rerank API fails.
         
-        for i, doc in enumerate(documents):
+        Each document is scored by its own chat completion; the calls run
+        concurrently, at most ``fallback_rerank_concurrency`` at a time and each
+        bounded by ``fallback_rerank_timeout``. Results keep document order.
+        
+        Returns a relevance score per document (None where scoring failed).
+        """
+        semaphore = asyncio.Semaphore(max(1, self.config.api.fallback_rerank_concurrency))
+        return await asyncio.gather(*[
+            self._score_document(query, doc, i, semaphore) for i, doc in enumerate(documents)
+        ])
+    
+    async def _score_document(self, query: str, document: str, index: int,
+                              semaphore: asyncio.Semaphore) -> Optional[float]:
+        """Score one document from the yes/no logprobs of the reranking model."""
+        async with semaphore:
             try:
                 # Format the reranking prompt according to Qwen3-Reranker format
-                task = "Given a web search query, retrieve relevant passages that answer the query"
-                prompt = self._format_reranking_prompt(task, query, doc)
+                prompt = self._format_reranking_prompt(RERANK_INSTRUCTION, query, document)
                 
-                response = await self.client.chat.completions.create(
-                    model=self.config.api.reranking_model,
-                    messages=[
-                        {
-                            "role": "system", 
-                            "content": "Judge whether the Document meets the requirements based on the Query and the Instruct provided. Note that the answer can only be \"yes\" or \"no\"."
-                        },
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=1,
-                    temperature=0.0,
-                    logprobs=True,
-                    top_logprobs=5
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        model=self.config.api.reranking_model,
+                        messages=[
+                            {
+                                "role": "system", 
+                                "content": "Judge whether the Document meets the requirements based on the Query and the Instruct provided. Note that the answer can only be \"yes\" or \"no\"."
+                            },
+                            {"role": "user", "content": prompt}
+                        ],
+                        max_tokens=1,
+                        temperature=0.0,
+                        logprobs=True,
+                        top_logprobs=5
+                    ),
+                    timeout=self.config.api.fallback_rerank_timeout
                 )
                 
                 # Extract relevance score from logprobs
-                score = self._extract_relevance_score(response)
-                results.append((indices[i], score))
+                return self._extract_relevance_score(response)
                 
+            except asyncio.TimeoutError:
+                print(f"Timed out reranking document {index}")
+                return None
             except Exception as e:
-                print(f"Error reranking document {indices[i]}: {e}")
-                # Assign neutral score on error
-                results.append((indices[i], 0.5))
-        
-        return results
+                print(f"Error reranking document {index}: {e}")
+                # No score on error; the document is left unscored and not cached
+                return None
     
     def _format_reranking_prompt(self, task: str, query: str, document: str) -> str:
         """Format the reranking prompt according to Qwen3-Reranker specifications."""
-        return f"<Instruct>: {task}\n\n<Query>: {query}\n\n<Document>: {document[:32000]}"  # Truncate long docs
+        api = self.config.api
+        doc_budget = min(
+            api.reranking_doc_max_tokens,
+            api.reranking_max_tokens - estimate_token_count(query) - RERANK_PAIR_OVERHEAD_TOKENS
+        )
+        document = trim_to_tokens(document, max(1, doc_budget))
+        return f"<Instruct>: {task}\n\n<Query>: {query}\n\n<Document>: {document}"
     
     def _extract_relevance_score(self, response) -> float:
         """Extract relevance score from model response logprobs."""
@@ -190,9 +454,9 @@ class RerankingService:
                 
             logprobs = response.choices[0].logprobs.content[0].top_logprobs
             
-            # Look for "yes" and "no" tokens
-            yes_score = 0.0
-            no_score = 0.0
+            # Look for "yes" and "no" tokens (logprobs are <= 0, so start below any of them)
+            yes_score = float("-inf")
+            no_score = float("-inf")
             
             for logprob in logprobs:
                 token = logprob.token.lower().strip()
@@ -0,0 +1,333 @@
+"""In-memory exact vector search over memory-mapped, read-only index snapshots."""
+
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Rows converted to float32 per matmul block, bounding temporary memory
+BLOCK_ROWS = 8192
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.npy"
+IDS_FILE = "ids.npy"
+
+# Snapshot layout under the flat index root
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+KEEP_SNAPSHOTS = 2  # Older snapshots are deleted once a new one is published
+
+# How each chunk column is stored in a snapshot
+CATEGORY_COLUMNS = ["repository_path", "file_path", "file_extension", "chunk_type", "language",
+                    "symbol_kind", "node_type"]  # int32 codes + distinct values in meta.json
+TEXT_COLUMNS = ["content", "symbol_path", "symbol_name", "parent_symbol", "content_hash"]  # UTF-8 blob + offsets
+INT_COLUMNS = ["start_line", "end_line", "start_char", "end_char", "depth"]  # int64 arrays
+SNAPSHOT_COLUMNS = ["id", *CATEGORY_COLUMNS, *TEXT_COLUMNS, *INT_COLUMNS]
+
+
+def _codes_file(column: str) -> str:
+    return f"{column}.codes.npy"
+
+
+def _offsets_file(column: str) -> str:
+    return f"{column}.offsets.npy"
+
+
+def _blob_file(column: str) -> str:
+    return f"{column}.bin"
+
+
+def _ints_file(column: str) -> str:
+    return f"{column}.npy"
+
+
+def _write_atomic(path: str, data: bytes):
+    """Replace a file's contents in one step."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _save_array(path: str, array: np.ndarray):
+    with open(path, "wb") as f:
+        np.save(f, array)
+
+
+def _load_array(path: str) -> np.ndarray:
+    """Memory-map an .npy file (zero-size arrays cannot be mapped and are read normally)."""
+    array = np.load(path, mmap_mode="r")
+    return array if array.size else np.load(path)
+
+
+def _map_bytes(path: str) -> np.ndarray:
+    """Memory-map a blob file as bytes."""
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (zero rows are left as is)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class FlatIndex:
+    """
+    Exact cosine search over a read-only snapshot of the chunks table.
+
+    Every array in a snapshot is memory-mapped, so loading is instant and
+    processes that open the same snapshot share one copy through the OS page
+    cache. A query is one matrix product plus ``argpartition`` for the top-k;
+    several queries share a single pass over the matrix. Filters are
+    equality tests on category columns, kept as integer codes so a filter is
+    a vectorized comparison rather than a SQL predicate. Matched rows are
+    read back from the snapshot's column files without touching LanceDB.
+
+    Files in a snapshot directory:
+        vectors.npy                (rows, dim) float16 or float32, unit-length rows
+        ids.npy                    (rows,) chunk IDs as fixed-width bytes
+        <column>.codes.npy         int32 code of each row's value (category columns)
+        <column>.bin, .offsets.npy UTF-8 values back to back and row boundaries (text columns)
+        <column>.npy               int64 value of each row (integer columns)
+        meta.json                  table version, dtype and the values behind the codes
+    """
+
+    def __init__(self, path: str, meta: Dict[str, Any]):
+        self.path = path
+        self.version = meta["version"]
+        self.values: Dict[str, List[str]] = meta["categories"]
+        self.ids = _load_array(os.path.join(path, IDS_FILE))
+        self.vectors = _load_array(os.path.join(path, VECTORS_FILE))
+        self.codes = {column: _load_array(os.path.join(path, _codes_file(column))) for column in self.values}
+        self.texts = {
+            column: (_load_array(os.path.join(path, _offsets_file(column))),
+                     _map_bytes(os.path.join(path, _blob_file(column))))
+            for column in meta["texts"]
+        }
+        self.ints = {column: _load_array(os.path.join(path, _ints_file(column))) for column in meta["ints"]}
+        self._code_by_value = {
+            column: {value: code for code, value in enumerate(column_values)}
+            for column, column_values in self.values.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def write(cls, path: str, batches: Iterable[Tuple[List[str], np.ndarray, Dict[str, List[Any]]]],
+              rows: int, dim: int, version: int, dtype: str = "float16"):
+        """
+        Write a snapshot directory from batches of rows.
+
+        Vectors and text columns are streamed to disk one batch at a time, so
+        the full table never has to fit in memory.
+
+        Args:
+            path: Directory to write to
+            batches: (chunk IDs, embeddings, column name -> values) per batch
+            rows: Total number of rows in the batches
+            dim: Embedding dimension
+            version: Table version the rows were read from
+            dtype: Storage type of the matrix, "float16" or "float32"
+        """
+        os.makedirs(path, exist_ok=True)
+
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if rows:
+            vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=dtype, shape=(rows, dim))
+        else:
+            # Memory-mapping a zero-size array fails
+            vectors = np.zeros((0, dim), dtype=dtype)
+            _save_array(vectors_path, vectors)
+
+        ids: List[str] = []
+        categories: Dict[str, List[str]] = {column: [] for column in CATEGORY_COLUMNS}
+        ints: Dict[str, List[int]] = {column: [] for column in INT_COLUMNS}
+        blobs = {column: open(os.path.join(path, _blob_file(column)), "wb") for column in TEXT_COLUMNS}
+        offsets: Dict[str, List[int]] = {column: [0] for column in TEXT_COLUMNS}
+        try:
+            for batch_ids, batch_vectors, batch_columns in batches:
+                if len(ids) + len(batch_ids) > rows:
+                    raise RuntimeError("More rows than expected; the table changed while building the snapshot")
+                vectors[len(ids):len(ids) + len(batch_ids)] = normalize_rows(batch_vectors)
+                ids.extend(batch_ids)
+                for column in CATEGORY_COLUMNS:
+                    categories[column].extend(batch_columns[column])
+                for column in INT_COLUMNS:
+                    ints[column].extend(batch_columns[column])
+                for column in TEXT_COLUMNS:
+                    for value in batch_columns[column]:
+                        encoded = (value or "").encode("utf-8")
+                        blobs[column].write(encoded)
+                        offsets[column].append(offsets[column][-1] + len(encoded))
+        finally:
+            for blob in blobs.values():
+                blob.close()
+        if len(ids) != rows:
+            raise RuntimeError("Fewer rows than expected; the table changed while building the snapshot")
+        if rows:
+            vectors.flush()
+        del vectors
+
+        values = {}
+        for column, column_values in categories.items():
+            distinct, codes = np.unique(np.asarray(column_values, dtype=str), return_inverse=True)
+            values[column] = distinct.tolist()
+            _save_array(os.path.join(path, _codes_file(column)), codes.astype(np.int32))
+        for column, column_values in ints.items():
+            _save_array(os.path.join(path, _ints_file(column)), np.asarray(column_values, dtype=np.int64))
+        for column, column_offsets in offsets.items():
+            _save_array(os.path.join(path, _offsets_file(column)), np.asarray(column_offsets, dtype=np.int64))
+        _save_array(os.path.join(path, IDS_FILE), np.asarray(ids, dtype=np.bytes_))
+
+        # The metadata goes last: a snapshot without it is incomplete
+        meta = {"version": version, "dtype": dtype, "rows": rows, "categories": values,
+                "texts": TEXT_COLUMNS, "ints": INT_COLUMNS}
+        _write_atomic(os.path.join(path, META_FILE), json.dumps(meta).encode("utf-8"))
+
+    @classmethod
+    def load(cls, path: str) -> Optional["FlatIndex"]:
+        """Memory-map a snapshot directory, or return None if it is incomplete."""
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return cls(path, meta)
+
+    def mask(self, filters: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """
+        Boolean mask of the rows matching every ``column == value`` filter.
+
+        Returns None when there are no filters (every row matches).
+        """
+        if not filters:
+            return None
+
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in filters.items():
+            code = self._code_by_value.get(column, {}).get(value)
+            if code is None:
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.codes[column] == code
+        return mask
+
+    def row(self, row: int) -> Dict[str, Any]:
+        """All stored columns of a row, including its (normalized) embedding."""
+        values: Dict[str, Any] = {"id": self.ids[row].decode("utf-8")}
+        for column, codes in self.codes.items():
+            values[column] = self.values[column][codes[row]]
+        for column, (offsets, blob) in self.texts.items():
+            values[column] = bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+        for column, array in self.ints.items():
+            values[column] = int(array[row])
+        values["embedding"] = self.vectors[row].astype(np.float32).tolist()
+        return values
+
+    def _similarities(self, queries: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every query to every row, shape (queries, rows)."""
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        if self.vectors.dtype == np.float32:
+            np.matmul(queries, self.vectors.T, out=scores)
+            return scores
+
+        # Half-precision products are not BLAS-accelerated; convert block by block
+        for start in range(0, len(self), BLOCK_ROWS):
+            block = self.vectors[start:start + BLOCK_ROWS].astype(np.float32)
+            np.matmul(queries, block.T, out=scores[:, start:start + len(block)])
+        return scores
+
+    def search(self, queries: Iterable[Sequence[float]], top_k: int,
+               masks: Optional[Sequence[Optional[np.ndarray]]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Find the nearest rows for a batch of queries.
+
+        Args:
+            queries: Query embeddings
+            top_k: Rows to return per query
+            masks: Optional row mask per query (see ``mask``)
+
+        Returns:
+            Per query, (row, cosine distance) pairs, closest first
+        """
+        queries = normalize_rows(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        if masks is None:
+            masks = [None] * len(queries)
+        if not len(self) or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = self._similarities(queries)
+
+        results = []
+        for query_scores, mask in zip(scores, masks):
+            rows = np.flatnonzero(mask) if mask is not None else None
+            candidates = query_scores[rows] if rows is not None else query_scores
+            k = min(top_k, len(candidates))
+            if k == 0:
+                results.append([])
+                continue
+
+            top = np.argpartition(-candidates, k - 1)[:k]
+            top = top[np.argsort(-candidates[top])]
+            top_rows = rows[top] if rows is not None else top
+            results.append([(int(row), float(1.0 - candidates[i])) for row, i in zip(top_rows, top)])
+        return results
+
+
+def current_snapshot(root: str) -> Optional[str]:
+    """Path of the snapshot the CURRENT pointer names, or None if nothing is published."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(root, SNAPSHOTS_DIR, name) if name else None
+
+
+def publish_snapshot(root: str, batches: Iterable[Tuple[List[str], np.ndarray, Dict[str, List[Any]]]],
+                     rows: int, dim: int, version: int, dtype: str = "float16") -> str:
+    """
+    Write a new snapshot and atomically point CURRENT at it.
+
+    Readers see either the old snapshot or the new one, never a partial
+    write. Snapshots beyond the newest ``KEEP_SNAPSHOTS`` are then deleted;
+    processes that still have one mapped keep reading it until they swap,
+    as the OS frees the files only once they are unmapped.
+
+    Returns:
+        Path of the published snapshot
+    """
+    name = f"v{version}-{time.time_ns()}-{os.getpid()}"
+    path = os.path.join(root, SNAPSHOTS_DIR, name)
+    try:
+        FlatIndex.write(path, batches, rows, dim, version, dtype)
+    except BaseException:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+
+    _write_atomic(os.path.join(root, CURRENT_FILE), name.encode("utf-8"))
+    _remove_old_snapshots(root, keep=name)
+    return path
+
+
+def _remove_old_snapshots(root: str, keep: str):
+    """Delete all but the newest snapshots (never the one named ``keep``)."""
+    snapshots_dir = os.path.join(root, SNAPSHOTS_DIR)
+
+    def _mtime(name: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(snapshots_dir, name))
+        except FileNotFoundError:  # Removed by another publisher
+            return 0.0
+
+    names = sorted((name for name in os.listdir(snapshots_dir) if name != keep), key=_mtime, reverse=True)
+    for name in names[KEEP_SNAPSHOTS - 1:]:
+        shutil.rmtree(os.path.join(snapshots_dir, name), ignore_errors=True)
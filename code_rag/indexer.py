@@ -2,7 +2,9 @@
 
 import os
 import asyncio
-from typing import List, Set, Optional
+import subprocess
+from datetime import datetime, timezone
+from typing import List, Set, Optional, Dict, Tuple
 from pathlib import Path
 import fnmatch
 from gitignore_parser import parse_gitignore
@@ -12,7 +14,20 @@ from tqdm import tqdm
 from .config import CodeRAGConfig
 from .tree_sitter_utils import CodeChunker, ChunkWithLocation
 from .embeddings import EmbeddingService
-from .database import DatabaseManager
+from .database import DatabaseManager, RepositoryRecord, compute_chunk_ids
+from .tracing import trace_span
+
+
+def _get_git_commit(repo_path: str) -> str:
+    """Return the HEAD commit of a git repository, or an empty string."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo_path,
+            capture_output=True, text=True, timeout=10
+        )
+        return result.stdout.strip() if result.returncode == 0 else ""
+    except (OSError, subprocess.SubprocessError):
+        return ""
 
 
 class RepositoryIndexer:
@@ -43,22 +58,31 @@ class RepositoryIndexer:
         
         print(f"Indexing repository: {repo_path}")
         
+        with trace_span("index.repository", repository=repo_path, force=force_reindex) as span:
+            result = await self._index_repository(repo_path, force_reindex)
+            span.attributes.update(status=result["status"], chunks=result["chunks"])
+        return result
+    
+    async def _index_repository(self, repo_path: str, force_reindex: bool) -> dict:
+        """Index a repository, timing each stage."""
+        timings: Dict[str, float] = {}
+        
         # Initialize database
-        await self.db_manager.initialize()
+        with trace_span("index.db_init", timings):
+            await self.db_manager.initialize()
         
         # Check if repository is already indexed
         if not force_reindex:
-            existing_chunks = await self.db_manager.get_chunks_by_repository(repo_path)
-            if existing_chunks:
-                print(f"Repository already indexed with {len(existing_chunks)} chunks. Use --force to reindex.")
-                return {"status": "already_indexed", "chunks": len(existing_chunks)}
-        else:
-            # Delete existing chunks for this repository
-            await self.db_manager.delete_repository(repo_path)
-            print("Deleted existing index for repository")
+            record = await self.db_manager.get_repository_record(repo_path)
+            existing_count = record.chunk_count if record else await self.db_manager.count_repository_chunks(repo_path)
+            if existing_count:
+                print(f"Repository already indexed with {existing_count} chunks. Use --force to reindex.")
+                return {"status": "already_indexed", "chunks": existing_count}
         
         # Find all supported files
-        files_to_process = self._find_files_to_process(repo_path)
+        with trace_span("index.scan", timings) as span:
+            files_to_process = self._find_files_to_process(repo_path)
+            span.attributes["files"] = len(files_to_process)
         print(f"Found {len(files_to_process)} files to process")
         
         if not files_to_process:
@@ -73,20 +97,83 @@ class RepositoryIndexer:
             batch_files = files_to_process[i:i + batch_size]
             print(f"Processing batch {i//batch_size + 1}/{(len(files_to_process) + batch_size - 1)//batch_size}")
             
-            batch_chunks = await self._process_file_batch(batch_files, repo_path)
+            with trace_span("index.parse", timings, files=len(batch_files)) as span:
+                batch_chunks = await self._process_file_batch(batch_files, repo_path)
+                span.attributes["chunks"] = len(batch_chunks)
             total_chunks += len(batch_chunks)
             
-            if batch_chunks:
-                # Generate embeddings for batch
-                print(f"Generating embeddings for {len(batch_chunks)} chunks...")
-                contents = [chunk.content for chunk in batch_chunks]
-                embeddings = await self.embedding_service.embed_texts(contents)
-                
-                # Store in database
-                await self.db_manager.add_chunks(batch_chunks, embeddings, repo_path)
+            # Upsert the batch; rows of these files that disappeared are removed
+            relative_paths = [os.path.relpath(f, repo_path) for f in batch_files]
+            with trace_span("index.embed", timings, chunks=len(batch_chunks)):
+                embeddings, update_embeddings = await self._embed_chunks(batch_chunks, repo_path)
+            with trace_span("index.upsert", timings, chunks=len(batch_chunks)):
+                await self.db_manager.add_chunks(batch_chunks, embeddings, repo_path, file_paths=relative_paths,
+                                                 update_embeddings=update_embeddings)
+        
+        if force_reindex:
+            # Drop rows of files that no longer exist in the repository
+            with trace_span("index.prune", timings):
+                await self.db_manager.prune_repository_files(
+                    repo_path, [os.path.relpath(f, repo_path) for f in files_to_process]
+                )
+        
+        await self._update_repository_record(repo_path)
         
         print(f"Successfully indexed repository with {total_chunks} chunks")
-        return {"status": "success", "chunks": total_chunks}
+        result = {"status": "success", "chunks": total_chunks, "timings_ms": timings}
+        
+        # Merge the small per-batch fragments and versions left by this run
+        if self.config.database.optimize_after_index:
+            with trace_span("index.optimize", timings):
+                report = await self.db_manager.optimize()
+            print(f"Optimized table: {report['before']['fragments']} -> {report['after']['fragments']} fragments, "
+                  f"{report['before']['versions']} -> {report['after']['versions']} versions")
+            result["optimize"] = report
+        
+        # Search processes swap to the new snapshot on their next consistency check
+        if self.db_manager.use_flat_index:
+            with trace_span("index.flat_index", timings):
+                await self.db_manager.publish_flat_index()
+        
+        print("Stage timings: " + ", ".join(f"{stage} {ms / 1000:.1f}s" for stage, ms in timings.items()))
+        return result
+    
+    async def _update_repository_record(self, repo_path: str):
+        """Record chunk count, time, commit and model for an indexed repository."""
+        await self.db_manager.upsert_repository_record(RepositoryRecord(
+            repository_path=repo_path,
+            chunk_count=await self.db_manager.count_repository_chunks(repo_path),
+            indexed_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            commit=_get_git_commit(repo_path),
+            embedding_model=self.config.api.embedding_model
+        ))
+    
+    async def _embed_chunks(self, chunks: List[ChunkWithLocation], repo_path: str) -> Tuple[List[List[float]], bool]:
+        """
+        Embed chunks, reusing stored embeddings for chunks whose ID already exists.
+        
+        Chunk IDs do not cover the embedding model, so stored vectors are only
+        reused when the repository was last indexed with the configured model.
+        
+        Returns:
+            The embeddings, and whether stored vectors were discarded because the model changed
+        """
+        if not chunks:
+            return [], False
+        
+        chunk_ids = compute_chunk_ids(repo_path, chunks)
+        record = await self.db_manager.get_repository_record(repo_path)
+        model_changed = record is None or record.embedding_model != self.config.api.embedding_model
+        existing = {} if model_changed else await self.db_manager.get_embeddings_by_ids(chunk_ids)
+        
+        missing = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in existing]
+        if missing:
+            print(f"Generating embeddings for {len(missing)} chunks ({len(chunks) - len(missing)} unchanged)...")
+            new_embeddings = await self.embedding_service.embed_texts([chunks[i].content for i in missing])
+            for i, embedding in zip(missing, new_embeddings):
+                existing[chunk_ids[i]] = embedding
+        
+        return [existing[chunk_id] for chunk_id in chunk_ids], model_changed
     
     async def _process_file_batch(self, file_paths: List[str], repo_path: str) -> List[ChunkWithLocation]:
         """Process a batch of files and extract chunks."""
@@ -233,22 +320,28 @@ class RepositoryIndexer:
         print(f"Indexing file: {file_path}")
         
         # Initialize database
-        await self.db_service.initialize()
+        await self.db_manager.initialize()
         
         # Process the file
         chunks = await self._process_single_file(file_path, repo_path)
+        relative_path = os.path.relpath(file_path, repo_path)
         
         if not chunks:
+            await self.db_manager.add_chunks([], [], repo_path, file_paths=[relative_path])
             print("No chunks extracted from file")
             return {"status": "no_chunks", "chunks": 0}
         
-        # Generate embeddings
-        print(f"Generating embeddings for {len(chunks)} chunks...")
-        contents = [chunk.content for chunk in chunks]
-        embeddings = await self.embedding_service.embed_texts(contents)
+        # Generate embeddings, reusing unchanged chunks
+        with trace_span("index.embed", file=relative_path, chunks=len(chunks)):
+            embeddings, update_embeddings = await self._embed_chunks(chunks, repo_path)
         
         # Store in database
-        await self.db_service.add_chunks(chunks, embeddings, repo_path)
+        with trace_span("index.upsert", file=relative_path, chunks=len(chunks)):
+            await self.db_manager.add_chunks(chunks, embeddings, repo_path, file_paths=[relative_path],
+                                             update_embeddings=update_embeddings)
+        await self._update_repository_record(repo_path)
+        if self.db_manager.use_flat_index:
+            await self.db_manager.publish_flat_index()
         
         print(f"Successfully indexed file with {len(chunks)} chunks")
         return {"status": "success", "chunks": len(chunks)} 
\ No newline at end of file
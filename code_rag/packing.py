@@ -0,0 +1,104 @@
+"""Token-budget packing of documents into rerank requests."""
+
+from typing import List, NamedTuple
+
+from .tree_sitter_utils import estimate_token_count
+
+
+# Characters per token, matching estimate_token_count
+CHARS_PER_TOKEN = 4
+
+# Marker inserted where the middle of a document was trimmed
+ELISION_MARKER = "\n...\n"
+
+# Share of a trimmed document's budget kept from its head (signature, docstring)
+HEAD_SHARE = 0.75
+
+
+class PackedBatch(NamedTuple):
+    """One rerank request: indices into the original documents and their (trimmed) texts."""
+    indices: List[int]
+    documents: List[str]
+    tokens: int
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Trim text to a token budget, preserving its head and tail.
+
+    The head holds a chunk's signature and docstring, which matter most for
+    relevance, so it gets most of the budget; the rest goes to the tail and
+    the middle is replaced by an elision marker. Cuts fall on line
+    boundaries where possible.
+
+    Args:
+        text: Text to trim
+        max_tokens: Token budget
+
+    Returns:
+        The text itself if it fits, otherwise the trimmed text
+    """
+    if estimate_token_count(text) <= max_tokens:
+        return text
+
+    max_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(ELISION_MARKER))
+    head_chars = int(max_chars * HEAD_SHARE)
+    tail_chars = max_chars - head_chars
+
+    head = text[:head_chars]
+    cut = head.rfind("\n")
+    if cut > head_chars // 2:
+        head = head[:cut]
+
+    tail = text[len(text) - tail_chars:] if tail_chars > 0 else ""
+    cut = tail.find("\n")
+    if 0 <= cut < len(tail) // 2:
+        tail = tail[cut + 1:]
+
+    return head + ELISION_MARKER + tail
+
+
+def pack_documents(query: str, documents: List[str], max_tokens: int,
+                   doc_max_tokens: int, pair_overhead_tokens: int = 0) -> List[PackedBatch]:
+    """
+    Trim documents and pack them into requests that fit a token budget.
+
+    Each document is capped at ``doc_max_tokens`` and at whatever fits next
+    to the query in a single (query, document) pair. Documents are then
+    packed greedily, in order, into batches whose (query + document) pairs
+    together stay within ``max_tokens``.
+
+    Args:
+        query: Rerank query
+        documents: Documents to score
+        max_tokens: Token budget per request (the reranker context)
+        doc_max_tokens: Token cap per document
+        pair_overhead_tokens: Prompt template tokens added to every pair
+
+    Returns:
+        Batches covering every document exactly once, in document order
+    """
+    query_tokens = estimate_token_count(query) + pair_overhead_tokens
+    doc_cap = max(1, min(doc_max_tokens, max_tokens - query_tokens))
+
+    batches: List[PackedBatch] = []
+    indices: List[int] = []
+    texts: List[str] = []
+    used = 0
+
+    for i, document in enumerate(documents):
+        text = trim_to_tokens(document, doc_cap)
+        pair_tokens = query_tokens + estimate_token_count(text)
+
+        if indices and used + pair_tokens > max_tokens:
+            batches.append(PackedBatch(indices, texts, used))
+            indices, texts, used = [], [], 0
+
+        indices.append(i)
+        texts.append(text)
+        used += pair_tokens
+
+    if indices:
+        batches.append(PackedBatch(indices, texts, used))
+
+    return batches
@@ -0,0 +1,64 @@
+"""Thin client for a running search server.
+
+Only aiohttp is imported here, so thin-client mode (``--server``) starts
+without loading the search stack.
+"""
+
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+import aiohttp
+
+
+class RemoteSearchClient:
+    """
+    Thin client for a running ``qwen-rag serve``.
+
+    ``url`` is either ``http://host:port`` or ``unix:/path/to/socket``.
+    """
+
+    def __init__(self, url: str, timeout: float = 300):
+        self.url = url
+        self.timeout = timeout
+
+    def _session(self) -> aiohttp.ClientSession:
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        if self.url.startswith("unix:"):
+            connector = aiohttp.UnixConnector(path=self.url[len("unix:"):])
+            return aiohttp.ClientSession(base_url="http://localhost", connector=connector, timeout=timeout)
+        return aiohttp.ClientSession(base_url=self.url.rstrip("/"), timeout=timeout)
+
+    async def _post(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        async with self._session() as session:
+            async with session.post(path, json=body) as response:
+                data = await response.json()
+                if response.status >= 400:
+                    raise RuntimeError(data.get("error", f"Server returned {response.status}"))
+                return data
+
+    async def search(self, query: str, **options) -> Dict[str, Any]:
+        """Search; options are the /search body fields (top_k, chunk_type, ...)."""
+        return await self._post("/search", {"query": query, **options})
+
+    async def search_stream(self, query: str, **options) -> AsyncIterator[Dict[str, Any]]:
+        """Search, yielding the provisional and then the final result."""
+        async with self._session() as session:
+            async with session.post("/search", json={"query": query, "stream": True, **options}) as response:
+                if response.status >= 400:
+                    data = await response.json()
+                    raise RuntimeError(data.get("error", f"Server returned {response.status}"))
+                async for line in response.content:
+                    if line.strip():
+                        yield json.loads(line)
+
+    async def search_many(self, queries: List[str], **options) -> List[Dict[str, Any]]:
+        """Run a batch of searches."""
+        return (await self._post("/search/batch", {"queries": queries, **options}))["results"]
+
+    async def similar(self, chunk_id: str, top_k: int = 5) -> Dict[str, Any]:
+        """Find chunks similar to a chunk."""
+        return await self._post("/similar", {"chunk_id": chunk_id, "top_k": top_k})
+
+    async def index(self, path: str, force: bool = False) -> Dict[str, Any]:
+        """Index a repository on the server."""
+        return await self._post("/index", {"path": path, "force": force})
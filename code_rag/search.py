@@ -1,12 +1,42 @@
 """Search service for querying indexed code."""
 
 import asyncio
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from dataclasses import dataclass, field
 
 from .config import CodeRAGConfig
-from .embeddings import EmbeddingService, RerankingService
-from .database import DatabaseManager, CodeChunk, SearchResult
+from .embeddings import EmbeddingService, RerankingService, RerankUsage
+from .database import DatabaseManager, CodeChunk, SearchResult, build_filter
+from .cascade import Candidate, score_candidates, plan_cascade, vector_similarity
+from .diversity import diversify_candidates, mmr_rank
+from .deadline import Deadline
+from .tracing import trace_span
+from .symbols import SymbolIndex, looks_like_identifier, CODE_IDENTIFIER_PATTERN
+
+
+def reciprocal_rank_fusion(rankings: List[List[CodeChunk]], weights: Optional[List[float]] = None,
+                           k: int = 60) -> List[Tuple[CodeChunk, float]]:
+    """
+    Fuse several rankings of chunks with weighted reciprocal rank fusion.
+    
+    Each chunk scores ``sum(weight / (k + rank))`` over the rankings it appears
+    in (rank starting at 1), so chunks found by both retrievers rise to the top.
+    
+    Returns:
+        (chunk, fused score) pairs sorted by descending score
+    """
+    if weights is None:
+        weights = [1.0] * len(rankings)
+    
+    chunks: Dict[str, CodeChunk] = {}
+    scores: Dict[str, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, chunk in enumerate(ranking, 1):
+            chunks.setdefault(chunk.id, chunk)
+            scores[chunk.id] = scores.get(chunk.id, 0.0) + weight / (k + rank)
+    
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [(chunks[chunk_id], scores[chunk_id]) for chunk_id in ordered]
 
 
 @dataclass
@@ -17,6 +47,52 @@ class QueryResult:
     total_chunks_searched: int
     reranked: bool
     execution_time_ms: float
+    reranker_calls: int = 0
+    reranker_tokens: int = 0
+    final: bool = True  # False for provisional results that a reranked result will replace
+    degraded_stages: List[str] = field(default_factory=list)  # e.g. "rerank:unavailable", "vector:reduced_nprobes"
+    timings_ms: Dict[str, float] = field(default_factory=dict)  # per stage: "embed", "vector_search", "rerank", ...
+    candidate_counts: Dict[str, int] = field(default_factory=dict)  # per stage: "vector", "fulltext", "fused", ...
+    cache_hits: Dict[str, int] = field(default_factory=dict)  # "query_embedding", "rerank"
+    
+    def to_dict(self, include_content: bool = True) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dict."""
+        return {
+            "query": self.query,
+            "final": self.final,
+            "reranked": self.reranked,
+            "total_chunks_searched": self.total_chunks_searched,
+            "execution_time_ms": round(self.execution_time_ms, 1),
+            "reranker_calls": self.reranker_calls,
+            "reranker_tokens": self.reranker_tokens,
+            "degraded_stages": self.degraded_stages,
+            "timings_ms": {stage: round(ms, 1) for stage, ms in self.timings_ms.items()},
+            "candidate_counts": self.candidate_counts,
+            "cache_hits": self.cache_hits,
+            "results": [result_to_dict(result, include_content) for result in self.results],
+        }
+
+
+def result_to_dict(result: SearchResult, include_content: bool = True) -> Dict[str, Any]:
+    """Convert a search result to a JSON-serializable dict."""
+    chunk = result.chunk
+    data = {
+        "rank": result.rank,
+        "score": result.score,
+        "vector_distance": result.vector_distance,
+        "relevance_score": result.relevance_score,
+        "id": chunk.id,
+        "file_path": chunk.file_path,
+        "start_line": chunk.start_line,
+        "end_line": chunk.end_line,
+        "repository_path": chunk.repository_path,
+        "chunk_type": chunk.chunk_type,
+        "symbol_path": chunk.symbol_path,
+        "language": chunk.language,
+    }
+    if include_content:
+        data["content"] = chunk.content
+    return data
 
 
 class SearchService:
@@ -27,22 +103,104 @@ class SearchService:
         self.embedding_service = EmbeddingService(config)
         self.reranking_service = RerankingService(config) if config.search.use_reranking else None
         self.db_manager = DatabaseManager(config)
+        self._symbol_index: Optional[SymbolIndex] = None
+        self._symbol_index_version: Optional[int] = None
     
     async def search(self, query: str, top_k: Optional[int] = None, 
                     use_reranking: Optional[bool] = None, 
-                    repository_filter: Optional[str] = None) -> QueryResult:
+                    repository_filter: Optional[str] = None,
+                    chunk_type: Optional[str] = None,
+                    file_extension: Optional[str] = None,
+                    budget_ms: Optional[float] = None,
+                    query_embedding: Optional[List[float]] = None) -> QueryResult:
         """
         Search for code chunks relevant to the query.
         
+        Filters are pushed down into the vector and full-text searches, so the
+        candidate set only contains matching chunks.
+        
         Args:
             query: The search query
             top_k: Number of final results to return
             use_reranking: Whether to use reranking (overrides config)
             repository_filter: Filter results to specific repository
+            chunk_type: Filter results to a chunk type (function, method, class, text)
+            file_extension: Filter results to a file extension (e.g. ".py")
+            budget_ms: Latency budget in milliseconds (overrides config); stages
+                that would overrun it are degraded and listed in ``degraded_stages``
+            query_embedding: Precomputed embedding of the query (skips embedding)
             
         Returns:
             QueryResult with search results and metadata
         """
+        query_result = None
+        async for query_result in self.search_stream(
+            query, top_k=top_k, use_reranking=use_reranking, repository_filter=repository_filter,
+            chunk_type=chunk_type, file_extension=file_extension, budget_ms=budget_ms,
+            query_embedding=query_embedding
+        ):
+            pass
+        return query_result
+    
+    async def search_many(self, queries: List[str], top_k: Optional[int] = None,
+                          use_reranking: Optional[bool] = None,
+                          repository_filter: Optional[str] = None,
+                          chunk_type: Optional[str] = None,
+                          file_extension: Optional[str] = None,
+                          budget_ms: Optional[float] = None) -> List[QueryResult]:
+        """
+        Run many searches at once.
+        
+        All queries are embedded up front in packed requests, then the searches
+        (vector and full-text retrieval, reranking) run concurrently, at most
+        ``search.batch_concurrency`` at a time. Arguments apply to every query;
+        ``budget_ms`` is each search's own latency budget.
+        
+        Returns:
+            One QueryResult per query, in input order
+        """
+        await self.db_manager.initialize()
+        
+        # Identifier queries are usually answered by the symbol index and need no embedding
+        to_embed = [
+            query for query in dict.fromkeys(queries)
+            if not (self.config.search.symbol_lookup and looks_like_identifier(query))
+        ]
+        embeddings: Dict[str, List[float]] = {}
+        if to_embed:
+            try:
+                embeddings = dict(zip(to_embed, await self.embedding_service.embed_queries(to_embed)))
+            except Exception as e:
+                # Each search embeds its own query instead
+                print(f"Error embedding query batch: {e}")
+        
+        semaphore = asyncio.Semaphore(max(1, self.config.search.batch_concurrency))
+        
+        async def _search(query: str) -> QueryResult:
+            async with semaphore:
+                return await self.search(
+                    query, top_k=top_k, use_reranking=use_reranking, repository_filter=repository_filter,
+                    chunk_type=chunk_type, file_extension=file_extension, budget_ms=budget_ms,
+                    query_embedding=embeddings.get(query)
+                )
+        
+        return await asyncio.gather(*[_search(query) for query in queries])
+    
+    async def search_stream(self, query: str, top_k: Optional[int] = None,
+                            use_reranking: Optional[bool] = None,
+                            repository_filter: Optional[str] = None,
+                            chunk_type: Optional[str] = None,
+                            file_extension: Optional[str] = None,
+                            budget_ms: Optional[float] = None,
+                            query_embedding: Optional[List[float]] = None) -> AsyncIterator[QueryResult]:
+        """
+        Search progressively, yielding provisional results before reranked ones.
+        
+        As soon as retrieval finishes, a provisional result (``final=False``)
+        ranked by first-stage scores is yielded; the reranked result follows
+        with ``final=True``. Searches that need no reranking yield a single
+        final result. Arguments are the same as for ``search``.
+        """
         import time
         start_time = time.time()
         
@@ -50,131 +208,397 @@ class SearchService:
         if top_k is None:
             top_k = self.config.search.top_k_final
         if use_reranking is None:
-            use_reranking = self.config.search.use_reranking and self.reranking_service is not None
+            use_reranking = self.config.search.use_reranking
+        use_reranking = use_reranking and self.reranking_service is not None
+        if budget_ms is None:
+            budget_ms = self.config.search.latency_budget_ms
+        deadline = Deadline(budget_ms)
+        degraded: List[str] = []
+        timings: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        cache_hits: Dict[str, int] = {}
+        usage = RerankUsage()
+        
+        def _query_result(results: List[SearchResult], total_chunks_searched: int,
+                          reranked: bool = False, final: bool = True) -> QueryResult:
+            return QueryResult(
+                query=query,
+                results=results,
+                total_chunks_searched=total_chunks_searched,
+                reranked=reranked,
+                execution_time_ms=(time.time() - start_time) * 1000,
+                reranker_calls=usage.calls,
+                reranker_tokens=usage.tokens,
+                final=final,
+                degraded_stages=list(degraded),
+                timings_ms=dict(timings),
+                candidate_counts=dict(counts),
+                cache_hits=dict(cache_hits)
+            )
         
         try:
-            # Initialize database
-            await self.db_manager.initialize()
+            # Open the database on first use; the handle is cached afterwards
+            with trace_span("search.db_init", timings):
+                await self.db_manager.initialize()
             
-            # Generate query embedding
-            query_embedding = await self.embedding_service.embed_text(query)
+            where = build_filter(
+                repository_path=repository_filter,
+                chunk_type=chunk_type,
+                file_extension=file_extension
+            )
+            
+            # Identifier queries are answered from the symbol index without model calls
+            if self.config.search.symbol_lookup and looks_like_identifier(query):
+                with trace_span("search.symbol_lookup", timings) as span:
+                    symbol_results = await self._search_symbols(query, top_k, where)
+                    span.attributes["matches"] = len(symbol_results)
+                if symbol_results:
+                    counts["symbol"] = len(symbol_results)
+                    yield _query_result(symbol_results, len(self._symbol_index))
+                    return
             
-            # Perform vector search
+            # Retrieve candidates (vector, or vector + BM25 fused)
             initial_k = self.config.search.top_k_initial if use_reranking else top_k
-            candidate_chunks = await self.db_manager.search_similar(query_embedding, initial_k)
-            
-            # Apply repository filter if specified
-            if repository_filter:
-                candidate_chunks = [
-                    chunk for chunk in candidate_chunks 
-                    if chunk.repository_path == repository_filter
-                ]
-            
-            # If no reranking, return vector search results
-            if not use_reranking or not candidate_chunks:
-                results = [
-                    SearchResult(chunk=chunk, score=1.0 - (i * 0.01), rank=i)
-                    for i, chunk in enumerate(candidate_chunks[:top_k])
-                ]
-                
-                execution_time = (time.time() - start_time) * 1000
-                return QueryResult(
-                    query=query,
-                    results=results,
-                    total_chunks_searched=len(candidate_chunks),
-                    reranked=False,
-                    execution_time_ms=execution_time
-                )
+            if self.config.search.diversify:
+                # Over-fetch so dropped duplicates leave room for other results
+                initial_k = max(initial_k, self.config.search.top_k_initial)
+            candidates = await self._retrieve_candidates(
+                query, initial_k, where, deadline, degraded, timings, counts, cache_hits, query_embedding
+            )
+            retrieved = len(candidates)
             
-            # Perform reranking
-            documents = [chunk.content for chunk in candidate_chunks]
-            reranked_indices = await self.reranking_service.rerank(query, documents, top_k)
+            # Score candidates cheaply and drop those below the similarity threshold,
+            # so clearly irrelevant chunks never reach the reranker
+            with trace_span("search.filter", timings):
+                score_candidates(query, candidates, self.config.database.distance_type)
+                candidates = self._apply_similarity_threshold(candidates)
+            counts["above_threshold"] = len(candidates)
             
-            # Create final results with reranking scores
-            results = []
-            for rank, idx in enumerate(reranked_indices):
-                if idx < len(candidate_chunks):
-                    chunk = candidate_chunks[idx]
-                    # Score decreases with rank (higher rank = lower score)
-                    score = 1.0 - (rank * 0.1)
-                    results.append(SearchResult(chunk=chunk, score=score, rank=rank))
+            # Near-identical chunks (vendored, copy-pasted code) would otherwise all be
+            # reranked and shown; keep the best of each and order the rest by MMR
+            if self.config.search.diversify:
+                with trace_span("search.diversify", timings) as span:
+                    candidates, duplicates = diversify_candidates(
+                        candidates,
+                        duplicate_threshold=self.config.search.duplicate_threshold,
+                        mmr_lambda=self.config.search.mmr_lambda
+                    )
+                    span.attributes["duplicates"] = duplicates
+                counts["duplicates"] = duplicates
             
-            execution_time = (time.time() - start_time) * 1000
-            return QueryResult(
-                query=query,
-                results=results,
-                total_chunks_searched=len(candidate_chunks),
-                reranked=True,
-                execution_time_ms=execution_time
-            )
+            # If no reranking, return retrieval results with their first-stage scores
+            if not use_reranking or not candidates:
+                with trace_span("search.format", timings):
+                    results = [
+                        self._to_search_result(candidate, i)
+                        for i, candidate in enumerate(self._best_first(candidates, top_k))
+                    ]
+                yield _query_result(results, retrieved)
+                return
+            
+            # Cascade: the cheap first stage keeps clear winners and drops clear
+            # misses, so only the ambiguous band reaches the reranker
+            if self.config.search.cascade:
+                with trace_span("search.cascade", timings):
+                    plan = plan_cascade(
+                        candidates, top_k,
+                        accept_score=self.config.search.cascade_accept_score,
+                        reject_score=self.config.search.cascade_reject_score,
+                        max_rerank=self.config.search.cascade_max_rerank,
+                        margin=self.config.search.cascade_margin,
+                        # Rerank the MMR-ordered band, not just the top cluster of near-variants
+                        keep_order=self.config.search.diversify
+                    )
+                ranked, to_rerank = list(plan.accepted), plan.to_rerank
+                counts["accepted"] = len(plan.accepted)
+                counts["rejected"] = plan.rejected
+            else:
+                ranked, to_rerank = [], candidates
+            
+            # Fit the rerank stage into what is left of the latency budget
+            to_rerank = self._budget_rerank(to_rerank, top_k - len(ranked), deadline, degraded)
+            counts["reranked"] = len(to_rerank)
+            
+            provisional = [
+                self._to_search_result(candidate, i)
+                for i, candidate in enumerate(self._best_first(candidates, top_k))
+            ]
+            
+            # Show first-stage results while the reranker works
+            if to_rerank:
+                yield _query_result(provisional, retrieved, final=False)
+            
+            # With diversification every reranked candidate competes in the final MMR pass
+            rerank_k = len(to_rerank) if self.config.search.diversify else top_k - len(ranked)
+            reranked = False
+            if to_rerank:
+                with trace_span("search.rerank", timings, candidates=len(to_rerank)) as span:
+                    try:
+                        scored = await deadline.run(self._rerank_candidates(query, to_rerank, rerank_k, usage))
+                        unscored = sum(candidate.relevance_score is None for candidate in scored)
+                        if scored and unscored == len(scored):
+                            # Endpoint down (open circuit, failed fallback): nothing was reranked
+                            degraded.append("rerank:unavailable")
+                        else:
+                            if unscored:
+                                # Unscored candidates keep their first-stage score
+                                degraded.append("rerank:partial")
+                            ranked.extend(scored)
+                            reranked = True
+                    except asyncio.TimeoutError:
+                        degraded.append("rerank:timeout")
+                    span.attributes.update(calls=usage.calls, tokens=usage.tokens, cached=usage.cached)
+                cache_hits["rerank"] = usage.cached
+            
+            with trace_span("search.format", timings):
+                if {"rerank:skipped", "rerank:timeout", "rerank:unavailable"} & set(degraded):
+                    # Out of time or no reranker: the first-stage ranking is the answer
+                    results = provisional
+                else:
+                    # Accepted and reranked candidates share the calibrated scale, so one
+                    # descending order lets callers stop at any score cutoff; with
+                    # diversification MMR on that scale picks which candidates make the top-k
+                    ranked.sort(key=self._calibrated_score, reverse=True)
+                    if self.config.search.diversify:
+                        ranked = mmr_rank(
+                            ranked, [self._calibrated_score(candidate) for candidate in ranked],
+                            self.config.search.mmr_lambda
+                        )
+                    results = [
+                        self._to_search_result(candidate, rank)
+                        for rank, candidate in enumerate(self._best_first(ranked, top_k))
+                    ]
+            
+            yield _query_result(results, retrieved, reranked=reranked)
             
         except Exception as e:
             print(f"Error during search: {e}")
-            execution_time = (time.time() - start_time) * 1000
-            return QueryResult(
-                query=query,
-                results=[],
-                total_chunks_searched=0,
-                reranked=False,
-                execution_time_ms=execution_time
-            )
+            yield _query_result([], 0)
     
-    async def search_by_file_type(self, query: str, file_extension: str, 
-                                 top_k: Optional[int] = None) -> QueryResult:
-        """Search for code chunks in specific file types."""
-        # This would require extending the database search capabilities
-        # For now, we'll do post-filtering
-        result = await self.search(query, top_k=top_k * 2 if top_k else 20)
-        
-        # Filter by file extension
-        filtered_results = [
-            res for res in result.results 
-            if res.chunk.file_extension == file_extension
+    def _budget_rerank(self, to_rerank: List[Candidate], slots: int, deadline: Deadline,
+                       degraded: List[str]) -> List[Candidate]:
+        """
+        Cut the rerank stage down to the remaining latency budget.
+        
+        Below ``rerank_min_budget_ms`` reranking is skipped; below
+        ``rerank_full_budget_ms`` only a proportional share of the candidates
+        (at least ``slots``) is reranked.
+        """
+        if not to_rerank or deadline.unlimited:
+            return to_rerank
+        
+        remaining = deadline.remaining_ms()
+        if remaining < self.config.search.rerank_min_budget_ms:
+            degraded.append("rerank:skipped")
+            return []
+        
+        full_budget = self.config.search.rerank_full_budget_ms
+        if remaining < full_budget:
+            keep = max(slots, int(len(to_rerank) * remaining / full_budget))
+            if keep < len(to_rerank):
+                degraded.append("rerank:truncated")
+                return to_rerank[:keep]
+        return to_rerank
+    
+    async def _get_symbol_index(self) -> SymbolIndex:
+        """Get the symbol index, rebuilding it when the table version changes."""
+        version = await self.db_manager.get_version()
+        if self._symbol_index is None or version != self._symbol_index_version:
+            self._symbol_index = SymbolIndex.from_columns(await self.db_manager.get_symbol_rows())
+            self._symbol_index_version = version
+        return self._symbol_index
+    
+    async def _search_symbols(self, query: str, top_k: int,
+                              where: Optional[str] = None) -> List[SearchResult]:
+        """
+        Look up a query in the symbol index.
+        
+        Exact name matches always count; prefix matches only for queries shaped
+        like code (snake_case, dotted or camelCase) rather than plain words.
+        """
+        symbol_index = await self._get_symbol_index()
+        allow_prefix = CODE_IDENTIFIER_PATTERN.search(query) is not None
+        limit = top_k * 4 if where else top_k
+        matches = symbol_index.lookup(query, limit=limit, allow_prefix=allow_prefix)
+        if not matches:
+            return []
+        
+        scores = {match.entry.chunk_id: match.score for match in matches}
+        chunks = await self.db_manager.get_chunks_by_ids(list(scores), where)
+        
+        return [
+            SearchResult(chunk=chunk, score=scores[chunk.id], rank=i)
+            for i, chunk in enumerate(chunks[:top_k])
         ]
+    
+    async def _retrieve_candidates(self, query: str, top_k: int, where: Optional[str] = None,
+                                   deadline: Optional[Deadline] = None,
+                                   degraded: Optional[List[str]] = None,
+                                   timings: Optional[Dict[str, float]] = None,
+                                   counts: Optional[Dict[str, int]] = None,
+                                   cache_hits: Optional[Dict[str, int]] = None,
+                                   query_embedding: Optional[List[float]] = None) -> List[Candidate]:
+        """
+        Retrieve candidate chunks for a query.
         
-        # Take only top_k results
-        if top_k:
-            filtered_results = filtered_results[:top_k]
+        In hybrid mode the BM25 search runs while the query is being embedded
+        and vector-searched, and both rankings are fused with RRF. Candidates
+        keep the vector distance and BM25 score of the searches that found them.
         
-        # Update ranks
-        for i, res in enumerate(filtered_results):
-            res = SearchResult(chunk=res.chunk, score=res.score, rank=i)
+        Under a deadline, a retriever that runs out of time contributes no
+        candidates, and the vector search uses ``degraded_nprobes`` when little
+        time is left. Degraded stages are appended to ``degraded``; stage
+        timings, candidate counts and cache hits are recorded in the other dicts.
+        A precomputed ``query_embedding`` skips the embedding call.
+        """
+        if deadline is None:
+            deadline = Deadline()
+        if degraded is None:
+            degraded = []
+        if counts is None:
+            counts = {}
         
-        return QueryResult(
-            query=result.query,
-            results=filtered_results,
-            total_chunks_searched=len([r for r in result.results if r.chunk.file_extension == file_extension]),
-            reranked=result.reranked,
-            execution_time_ms=result.execution_time_ms
-        )
+        async def _vector_search():
+            embedding = query_embedding
+            if embedding is None:
+                try:
+                    with trace_span("search.embed", timings):
+                        embedding = await deadline.run(
+                            self.embedding_service.embed_text(query, cache_hits=cache_hits)
+                        )
+                except asyncio.TimeoutError:
+                    degraded.append("embed:timeout")
+                    return []
+            
+            nprobes = None
+            if deadline.remaining_ms() < self.config.search.vector_min_budget_ms:
+                nprobes = self.config.search.degraded_nprobes
+                degraded.append("vector:reduced_nprobes")
+            try:
+                with trace_span("search.vector_search", timings) as span:
+                    hits = await deadline.run(
+                        self.db_manager.search_similar(embedding, top_k, where, nprobes=nprobes)
+                    )
+                    span.attributes["hits"] = len(hits)
+            except asyncio.TimeoutError:
+                degraded.append("vector:timeout")
+                return []
+            counts["vector"] = len(hits)
+            return hits
+        
+        async def _fulltext_search():
+            try:
+                with trace_span("search.fulltext_search", timings) as span:
+                    hits = await deadline.run(self.db_manager.search_fulltext(query, top_k, where))
+                    span.attributes["hits"] = len(hits)
+            except asyncio.TimeoutError:
+                degraded.append("fulltext:timeout")
+                return []
+            counts["fulltext"] = len(hits)
+            return hits
+        
+        if not self.config.search.hybrid_search:
+            return [Candidate(hit.chunk, vector_distance=hit.score) for hit in await _vector_search()]
+        
+        vector_hits, lexical_hits = await asyncio.gather(_vector_search(), _fulltext_search())
+        distances = {hit.chunk.id: hit.score for hit in vector_hits}
+        lexical_scores = {hit.chunk.id: hit.score for hit in lexical_hits}
+        
+        with trace_span("search.fusion", timings):
+            fused = reciprocal_rank_fusion(
+                [[hit.chunk for hit in vector_hits], [hit.chunk for hit in lexical_hits]],
+                weights=[self.config.search.vector_weight, self.config.search.lexical_weight],
+                k=self.config.search.rrf_k
+            )
+        counts["fused"] = min(len(fused), top_k)
+        return [
+            Candidate(chunk, vector_distance=distances.get(chunk.id), lexical_score=lexical_scores.get(chunk.id))
+            for chunk, _ in fused[:top_k]
+        ]
     
-    async def search_by_chunk_type(self, query: str, chunk_type: str, 
-                                  top_k: Optional[int] = None) -> QueryResult:
-        """Search for specific types of code chunks (functions, classes, etc.)."""
-        # Similar to file type search - post-filtering approach
-        result = await self.search(query, top_k=top_k * 2 if top_k else 20)
+    def _apply_similarity_threshold(self, candidates: List[Candidate]) -> List[Candidate]:
+        """
+        Drop candidates whose vector similarity is below ``search.similarity_threshold``.
         
-        # Filter by chunk type
-        filtered_results = [
-            res for res in result.results 
-            if res.chunk.chunk_type == chunk_type
+        Candidates found only by full-text search have no vector distance and are kept.
+        """
+        threshold = self.config.search.similarity_threshold
+        distance_type = self.config.database.distance_type
+        return [
+            candidate for candidate in candidates
+            if candidate.vector_distance is None
+            or vector_similarity(candidate.vector_distance, distance_type) >= threshold
         ]
+    
+    @staticmethod
+    def _calibrated_score(candidate: Candidate) -> float:
+        """Reranker relevance if the candidate was reranked, otherwise its first-stage score."""
+        if candidate.relevance_score is not None:
+            return candidate.relevance_score
+        return candidate.cheap_score
+    
+    def _best_first(self, candidates: List[Candidate], top_k: int) -> List[Candidate]:
+        """
+        The first ``top_k`` candidates, best calibrated score first.
         
-        # Take only top_k results
-        if top_k:
-            filtered_results = filtered_results[:top_k]
+        With diversification the candidates are in MMR order, which decides
+        which chunks make the top-k; they are still returned by score so
+        callers can stop at a score cutoff.
+        """
+        selected = candidates[:top_k]
+        if self.config.search.diversify:
+            selected = sorted(selected, key=self._calibrated_score, reverse=True)
+        return selected
+    
+    def _to_search_result(self, candidate: Candidate, rank: int) -> SearchResult:
+        """Build a search result carrying the candidate's raw and calibrated scores."""
+        return SearchResult(
+            chunk=candidate.chunk,
+            score=self._calibrated_score(candidate),
+            rank=rank,
+            vector_distance=candidate.vector_distance,
+            relevance_score=candidate.relevance_score
+        )
+    
+    async def _rerank_candidates(self, query: str, candidates: List[Candidate], top_k: int,
+                                 usage: Optional[RerankUsage] = None) -> List[Candidate]:
+        """
+        Rerank candidates and return the best ``top_k`` with their relevance scores.
         
-        # Update ranks
-        for i, res in enumerate(filtered_results):
-            res = SearchResult(chunk=res.chunk, score=res.score, rank=i)
+        Candidates the reranker could not score come last, in their original
+        order, with ``relevance_score`` left as None.
+        """
+        if top_k <= 0:
+            return []
         
-        return QueryResult(
-            query=result.query,
-            results=filtered_results,
-            total_chunks_searched=len([r for r in result.results if r.chunk.chunk_type == chunk_type]),
-            reranked=result.reranked,
-            execution_time_ms=result.execution_time_ms
+        documents = [candidate.chunk.content for candidate in candidates]
+        document_hashes = [candidate.chunk.content_hash or None for candidate in candidates]
+        ranked = await self.reranking_service.rerank_with_scores(
+            query, documents, top_k,
+            document_hashes=document_hashes if all(document_hashes) else None,
+            usage=usage
         )
+        
+        reranked = []
+        for idx, score in ranked:
+            candidate = candidates[idx]
+            candidate.relevance_score = score
+            reranked.append(candidate)
+        return reranked
+    
+    async def warm_up(self):
+        """Open database handles and pre-load index metadata before the first query."""
+        await self.db_manager.warm_up()
+    
+    async def search_by_file_type(self, query: str, file_extension: str, 
+                                 top_k: Optional[int] = None) -> QueryResult:
+        """Search for code chunks in specific file types."""
+        return await self.search(query, top_k=top_k, file_extension=file_extension)
+    
+    async def search_by_chunk_type(self, query: str, chunk_type: str, 
+                                  top_k: Optional[int] = None) -> QueryResult:
+        """Search for specific types of code chunks (functions, classes, etc.)."""
+        return await self.search(query, top_k=top_k, chunk_type=chunk_type)
     
     async def get_similar_to_chunk(self, chunk_id: str, top_k: int = 5) -> List[SearchResult]:
         """Find chunks similar to a given chunk."""
@@ -182,25 +606,25 @@ class SearchService:
             await self.db_manager.initialize()
             
             # Get the reference chunk
-            all_chunks = await self.db_manager.search_similar([0.0] * 2560, 10000)  # Get all chunks
-            reference_chunk = None
-            for chunk in all_chunks:
-                if chunk.id == chunk_id:
-                    reference_chunk = chunk
-                    break
-            
-            if not reference_chunk:
+            reference = await self.db_manager.get_chunks_by_ids([chunk_id])
+            if not reference:
                 return []
             
             # Use the chunk's embedding to find similar chunks
-            similar_chunks = await self.db_manager.search_similar(reference_chunk.embedding, top_k + 1)
+            similar_hits = await self.db_manager.search_similar(reference[0].embedding, top_k + 1)
             
             # Remove the reference chunk itself
-            similar_chunks = [chunk for chunk in similar_chunks if chunk.id != chunk_id][:top_k]
+            similar_hits = [hit for hit in similar_hits if hit.chunk.id != chunk_id][:top_k]
             
+            distance_type = self.config.database.distance_type
             results = [
-                SearchResult(chunk=chunk, score=1.0 - (i * 0.1), rank=i)
-                for i, chunk in enumerate(similar_chunks)
+                SearchResult(
+                    chunk=hit.chunk,
+                    score=vector_similarity(hit.score, distance_type),
+                    rank=i,
+                    vector_distance=hit.score
+                )
+                for i, hit in enumerate(similar_hits)
             ]
             
             return results
@@ -221,6 +645,16 @@ class SearchService:
         lines.append(f"Found {len(query_result.results)} results in {query_result.execution_time_ms:.1f}ms")
         lines.append(f"Searched {query_result.total_chunks_searched} chunks")
         lines.append(f"Reranked: {'Yes' if query_result.reranked else 'No'}")
+        if query_result.degraded_stages:
+            lines.append(f"Degraded: {', '.join(query_result.degraded_stages)}")
+        if query_result.timings_ms:
+            lines.append("Timings: " + ", ".join(
+                f"{stage} {ms:.1f}ms" for stage, ms in query_result.timings_ms.items()
+            ))
+        if query_result.reranker_calls:
+            lines.append(
+                f"Reranker: {query_result.reranker_calls} request(s), ~{query_result.reranker_tokens} tokens"
+            )
         lines.append("-" * 80)
         
         for i, result in enumerate(query_result.results, 1):
@@ -243,4 +677,5 @@ class SearchService:
     
     async def close(self):
         """Close any open connections."""
+        await self.embedding_service.close()
         await self.db_manager.close() 
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""Long-running search server; its thin client lives in ``remote``."""
+
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+from .config import CodeRAGConfig
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, default=str)
+
+
+def _search_options(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Search keyword arguments from a request body."""
+    return {
+        "top_k": body.get("top_k"),
+        "use_reranking": body.get("use_reranking"),
+        "repository_filter": body.get("repository"),
+        "chunk_type": body.get("chunk_type"),
+        "file_extension": body.get("file_extension"),
+        "budget_ms": body.get("budget_ms"),
+    }
+
+
+class SearchServer:
+    """
+    HTTP/JSON server that keeps a ``SearchService`` warm between requests.
+
+    Database handles, caches, the symbol index and HTTP connection pools
+    live for the life of the process, so a query only pays model time. The
+    indexer (and its tree-sitter grammars) is only created on the first
+    index request.
+
+    Endpoints:
+        GET  /health           liveness
+        GET  /stats            database and cache statistics
+        POST /search           {"query", "top_k", "use_reranking", "repository", "chunk_type",
+                                "file_extension", "budget_ms", "include_content", "stream"}
+        POST /search/batch     {"queries": [...], ...same filters and budget_ms}
+        POST /similar          {"chunk_id", "top_k", "include_content"}
+        POST /index            {"path", "force"}
+    """
+
+    def __init__(self, config: CodeRAGConfig):
+        # The search stack loads with the server, never with the thin client
+        from .search import SearchService
+        self.config = config
+        self.search_service = SearchService(config)
+        self._indexer = None
+        self._index_lock = asyncio.Lock()
+
+    def create_app(self) -> web.Application:
+        """Build the aiohttp application."""
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/search", self.handle_search)
+        app.router.add_post("/search/batch", self.handle_search_batch)
+        app.router.add_post("/similar", self.handle_similar)
+        app.router.add_post("/index", self.handle_index)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, app: web.Application):
+        await self.search_service.warm_up()
+
+    async def _on_cleanup(self, app: web.Application):
+        await self.search_service.close()
+
+    @staticmethod
+    async def _read_body(request: web.Request) -> Dict[str, Any]:
+        try:
+            body = await request.json()
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            raise web.HTTPBadRequest(text=_dumps({"error": "Request body must be JSON"}),
+                                     content_type="application/json")
+        if not isinstance(body, dict):
+            raise web.HTTPBadRequest(text=_dumps({"error": "Request body must be a JSON object"}),
+                                     content_type="application/json")
+        return body
+
+    @staticmethod
+    def _bad_request(message: str) -> web.Response:
+        return web.json_response({"error": message}, status=400, dumps=_dumps)
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        stats = await self.search_service.db_manager.get_stats()
+        stats["query_embedding_cache"] = self.search_service.embedding_service.cache_stats()
+        if self.search_service.reranking_service is not None:
+            stats["rerank_cache"] = self.search_service.reranking_service.score_cache.stats()
+        return web.json_response(stats, dumps=_dumps)
+
+    async def handle_search(self, request: web.Request) -> web.StreamResponse:
+        body = await self._read_body(request)
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            return self._bad_request("'query' is required")
+
+        include_content = body.get("include_content", True)
+        options = _search_options(body)
+
+        if not body.get("stream"):
+            query_result = await self.search_service.search(query, **options)
+            return web.json_response(query_result.to_dict(include_content), dumps=_dumps)
+
+        # Stream JSON lines: provisional results first, then the reranked ones
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async for query_result in self.search_service.search_stream(query, **options):
+            await response.write((_dumps(query_result.to_dict(include_content)) + "\n").encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    async def handle_search_batch(self, request: web.Request) -> web.Response:
+        body = await self._read_body(request)
+        queries = body.get("queries")
+        if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+            return self._bad_request("'queries' must be a list of strings")
+
+        include_content = body.get("include_content", True)
+        query_results = await self.search_service.search_many(queries, **_search_options(body))
+        return web.json_response(
+            {"results": [query_result.to_dict(include_content) for query_result in query_results]},
+            dumps=_dumps
+        )
+
+    async def handle_similar(self, request: web.Request) -> web.Response:
+        from .search import result_to_dict
+        body = await self._read_body(request)
+        chunk_id = body.get("chunk_id")
+        if not isinstance(chunk_id, str) or not chunk_id:
+            return self._bad_request("'chunk_id' is required")
+
+        results = await self.search_service.get_similar_to_chunk(chunk_id, top_k=body.get("top_k", 5))
+        include_content = body.get("include_content", True)
+        return web.json_response(
+            {"chunk_id": chunk_id, "results": [result_to_dict(result, include_content) for result in results]},
+            dumps=_dumps
+        )
+
+    async def handle_index(self, request: web.Request) -> web.Response:
+        body = await self._read_body(request)
+        path = body.get("path")
+        if not isinstance(path, str) or not path:
+            return self._bad_request("'path' is required")
+
+        # Indexing writes to the table, so runs are serialized
+        async with self._index_lock:
+            if self._indexer is None:
+                from .indexer import RepositoryIndexer
+                self._indexer = RepositoryIndexer(self.config)
+            try:
+                result = await self._indexer.index_repository(path, force_reindex=bool(body.get("force")))
+            except ValueError as e:
+                return self._bad_request(str(e))
+
+        # Pick up the new table version right away
+        await self.search_service.db_manager.refresh()
+        return web.json_response(result, dumps=_dumps)
+
+
+def run_server(config: CodeRAGConfig, host: Optional[str] = None, port: Optional[int] = None,
+               socket_path: Optional[str] = None):
+    """Serve until interrupted, on a Unix socket if ``socket_path`` is set, otherwise on host:port."""
+    app = SearchServer(config).create_app()
+    socket_path = socket_path or config.server.socket_path
+    if socket_path:
+        print(f"Serving on unix:{socket_path}")
+        web.run_app(app, path=socket_path, print=None)
+    else:
+        host = host or config.server.host
+        port = port or config.server.port
+        print(f"Serving on http://{host}:{port}")
+        web.run_app(app, host=host, port=port, print=None)
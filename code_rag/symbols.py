@@ -0,0 +1,117 @@
+"""In-memory symbol-name index for instant identifier lookups."""
+
+import re
+from bisect import bisect_left
+from typing import List, Dict, NamedTuple
+
+
+# A bare or dotted identifier such as "parse_gitignore" or "SearchService.search"
+IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_$][\w$]*(\.[A-Za-z_$][\w$]*)*$")
+
+# Identifier shapes unlikely to be plain English words: snake_case, dotted or camelCase
+CODE_IDENTIFIER_PATTERN = re.compile(r"[_.$]|[a-z][A-Z]")
+
+
+def looks_like_identifier(query: str) -> bool:
+    """Check whether a query is a single (possibly dotted) identifier."""
+    return bool(IDENTIFIER_PATTERN.match(query.strip()))
+
+
+class SymbolEntry(NamedTuple):
+    """A named symbol of an indexed chunk."""
+    chunk_id: str
+    name: str
+    qualified_name: str
+    kind: str
+    language: str
+
+
+class SymbolMatch(NamedTuple):
+    """A symbol lookup hit with its match quality."""
+    entry: SymbolEntry
+    score: float
+    match_type: str  # "exact", "exact_ci" or "prefix"
+
+
+class SymbolIndex:
+    """
+    Exact and prefix index over symbol names and qualified names.
+
+    Both ``name`` ("search") and ``qualified_name`` ("SearchService.search") are
+    keys. Exact lookups are dictionary hits; prefix lookups bisect a sorted
+    list of lowercased keys.
+    """
+
+    def __init__(self, entries: List[SymbolEntry]):
+        self.entries = entries
+        self._exact: Dict[str, List[int]] = {}
+        self._exact_ci: Dict[str, List[int]] = {}
+
+        for i, entry in enumerate(entries):
+            for key in {entry.name, entry.qualified_name}:
+                if not key:
+                    continue
+                self._exact.setdefault(key, []).append(i)
+                self._exact_ci.setdefault(key.lower(), []).append(i)
+
+        self._sorted_keys = sorted(self._exact_ci)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[str]]) -> "SymbolIndex":
+        """Build an index from the column dict returned by ``DatabaseManager.get_symbol_rows``."""
+        entries = [
+            SymbolEntry(chunk_id, name, qualified_name, kind, language)
+            for chunk_id, name, qualified_name, kind, language in zip(
+                columns["id"], columns["symbol_name"], columns["symbol_path"],
+                columns["symbol_kind"], columns["language"]
+            )
+        ]
+        return cls(entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def lookup(self, query: str, limit: int = 10, allow_prefix: bool = True) -> List[SymbolMatch]:
+        """
+        Look up symbols matching a query.
+
+        Exact (case-sensitive) matches rank first, then case-insensitive exact
+        matches, then prefix matches.
+
+        Args:
+            query: Symbol name or qualified name
+            limit: Maximum number of matches
+            allow_prefix: Whether to include prefix matches
+
+        Returns:
+            Matches ordered by match quality
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        lowered = query.lower()
+        matches: List[SymbolMatch] = []
+        seen = set()
+
+        def _collect(indices: List[int], score: float, match_type: str):
+            for i in indices:
+                if len(matches) >= limit:
+                    return
+                if i not in seen:
+                    seen.add(i)
+                    matches.append(SymbolMatch(self.entries[i], score, match_type))
+
+        _collect(self._exact.get(query, []), 1.0, "exact")
+        _collect(self._exact_ci.get(lowered, []), 0.9, "exact_ci")
+
+        if allow_prefix:
+            position = bisect_left(self._sorted_keys, lowered)
+            while position < len(self._sorted_keys) and len(matches) < limit:
+                key = self._sorted_keys[position]
+                if not key.startswith(lowered):
+                    break
+                _collect(self._exact_ci[key], 0.8, "prefix")
+                position += 1
+
+        return matches
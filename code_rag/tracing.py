@@ -0,0 +1,84 @@
+"""Tracing hooks for search and indexing stages."""
+
+import time
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+
+@dataclass
+class Span:
+    """A timed stage of a search or indexing run."""
+    name: str  # e.g. "search.embed", "index.upsert"
+    start_time: float  # Unix time the stage started
+    duration_ms: float = 0.0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+TraceHook = Callable[[Span], None]
+
+_hooks: List[TraceHook] = []
+
+
+def add_trace_hook(hook: TraceHook):
+    """Register a callback that receives every finished span."""
+    _hooks.append(hook)
+
+
+def remove_trace_hook(hook: TraceHook):
+    """Unregister a span callback."""
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def _otel_value(value: Any) -> Any:
+    """Convert an attribute to a type OpenTelemetry accepts."""
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return str(value)
+
+
+@contextmanager
+def trace_span(name: str, timings: Optional[Dict[str, float]] = None, **attributes) -> Iterator[Span]:
+    """
+    Time a stage and report it to the registered hooks.
+
+    The duration is added to ``timings`` under the name without its
+    component prefix ("search.embed" is recorded as "embed"). Attributes set
+    on the yielded span before it closes are reported too. When
+    OpenTelemetry is installed the stage is also recorded as an
+    OpenTelemetry span, nested under the current one.
+    """
+    span = Span(name=name, start_time=time.time(), attributes=dict(attributes))
+    start = time.perf_counter()
+
+    with ExitStack() as stack:
+        otel_span = None
+        if otel_trace is not None:
+            otel_span = stack.enter_context(otel_trace.get_tracer("code_rag").start_as_current_span(name))
+
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            if timings is not None:
+                key = name.split(".", 1)[-1]
+                timings[key] = timings.get(key, 0.0) + span.duration_ms
+            if otel_span is not None:
+                for key, value in span.attributes.items():
+                    otel_span.set_attribute(key, _otel_value(value))
+
+            for hook in list(_hooks):
+                try:
+                    hook(span)
+                except Exception as e:
+                    print(f"Error in trace hook: {e}")
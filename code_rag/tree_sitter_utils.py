@@ -2,54 +2,10 @@
 
 import os
 import asyncio
+import importlib
 from typing import List, Dict, Optional, AsyncGenerator, NamedTuple
 from pathlib import Path
 
-try:
-    import tree_sitter_python as tspython
-except ImportError:
-    tspython = None
-
-try:
-    import tree_sitter_javascript as tsjavascript
-except ImportError:
-    tsjavascript = None
-
-try:
-    import tree_sitter_typescript as tstypescript
-except ImportError:
-    tstypescript = None
-
-try:
-    import tree_sitter_java as tsjava
-except ImportError:
-    tsjava = None
-
-try:
-    import tree_sitter_cpp as tscpp
-except ImportError:
-    tscpp = None
-
-try:
-    import tree_sitter_c as tsc
-except ImportError:
-    tsc = None
-
-try:
-    import tree_sitter_c_sharp as tscsharp
-except ImportError:
-    tscsharp = None
-
-try:
-    import tree_sitter_rust as tsrust
-except ImportError:
-    tsrust = None
-
-try:
-    import tree_sitter_go as tsgo
-except ImportError:
-    tsgo = None
-
 from tree_sitter import Language, Parser, Node
 
 
@@ -61,6 +17,45 @@ class ChunkWithLocation(NamedTuple):
     end_line: int
     start_char: int
     end_char: int
+    symbol_path: str = ""  # Dotted symbol path of the chunk, e.g. "MyClass.method"
+    symbol_name: str = ""  # Declared name of the chunk's symbol, e.g. "method"
+    symbol_kind: str = ""  # "function", "method" or "class"; empty for text chunks
+    language: str = ""
+    node_type: str = ""  # Tree-sitter node type, e.g. "function_definition"
+    parent_symbol: str = ""  # Symbol path of the enclosing symbol, e.g. "MyClass"
+    depth: int = 0  # Number of enclosing symbols
+
+
+# Language names by file extension
+LANGUAGE_NAMES = {
+    '.py': 'python', '.js': 'javascript', '.jsx': 'javascript', '.ts': 'typescript',
+    '.tsx': 'typescript', '.java': 'java', '.cpp': 'cpp', '.cc': 'cpp', '.cxx': 'cpp',
+    '.hpp': 'cpp', '.h': 'c', '.c': 'c', '.cs': 'c_sharp', '.rs': 'rust', '.go': 'go',
+    '.php': 'php', '.rb': 'ruby', '.swift': 'swift', '.kt': 'kotlin', '.scala': 'scala',
+    '.sh': 'shell', '.sql': 'sql', '.md': 'markdown', '.txt': 'text', '.yaml': 'yaml',
+    '.yml': 'yaml', '.json': 'json', '.xml': 'xml', '.html': 'html', '.css': 'css',
+}
+
+# Leaf node types of a C/C++ declarator chain that carry the declared name
+DECLARATOR_NAME_TYPES = {
+    "identifier", "field_identifier", "qualified_identifier", "destructor_name", "operator_name",
+}
+
+
+def language_for_path(file_path: str) -> str:
+    """Get the language name for a file from its extension."""
+    extension = Path(file_path).suffix.lower()
+    return LANGUAGE_NAMES.get(extension, extension.lstrip('.'))
+
+
+# Tree-sitter grammar modules by file extension, imported on first use
+GRAMMAR_MODULES = {
+    '.py': 'tree_sitter_python', '.js': 'tree_sitter_javascript', '.jsx': 'tree_sitter_javascript',
+    '.ts': 'tree_sitter_typescript', '.tsx': 'tree_sitter_typescript', '.java': 'tree_sitter_java',
+    '.cpp': 'tree_sitter_cpp', '.cc': 'tree_sitter_cpp', '.cxx': 'tree_sitter_cpp',
+    '.hpp': 'tree_sitter_cpp', '.h': 'tree_sitter_c', '.c': 'tree_sitter_c',
+    '.cs': 'tree_sitter_c_sharp', '.rs': 'tree_sitter_rust', '.go': 'tree_sitter_go',
+}
 
 
 def _try_get_language(module, module_name: str):
@@ -90,37 +85,26 @@ class TreeSitterManager:
     
     def __init__(self):
         self._parsers: Dict[str, Parser] = {}
-        self._languages = {}
-        
-        # Initialize languages with fallback handling
-        language_modules = [
-            ('.py', tspython, 'tree_sitter_python'),
-            ('.js', tsjavascript, 'tree_sitter_javascript'),  
-            ('.jsx', tsjavascript, 'tree_sitter_javascript'),
-            ('.ts', tstypescript, 'tree_sitter_typescript'),
-            ('.tsx', tstypescript, 'tree_sitter_typescript'),
-            ('.java', tsjava, 'tree_sitter_java'),
-            ('.cpp', tscpp, 'tree_sitter_cpp'),
-            ('.cc', tscpp, 'tree_sitter_cpp'),
-            ('.cxx', tscpp, 'tree_sitter_cpp'),
-            ('.hpp', tscpp, 'tree_sitter_cpp'),
-            ('.h', tsc, 'tree_sitter_c'),
-            ('.c', tsc, 'tree_sitter_c'),
-            ('.cs', tscsharp, 'tree_sitter_c_sharp'),
-            ('.rs', tsrust, 'tree_sitter_rust'),
-            ('.go', tsgo, 'tree_sitter_go'),
-        ]
-        
-        for ext, module, name in language_modules:
-            lang = _try_get_language(module, name)
-            if lang:
-                self._languages[ext] = lang
-        
-        print(f"✅ Initialized tree-sitter for {len(self._languages)} language(s): {', '.join(self._languages.keys())}")
+        # Grammars load on first use of an extension; None marks one that failed to load
+        self._languages: Dict[str, Optional[Language]] = {}
+    
+    def _get_language(self, file_extension: str) -> Optional[Language]:
+        """Import the grammar for an extension the first time it is needed."""
+        if file_extension not in self._languages:
+            module_name = GRAMMAR_MODULES.get(file_extension)
+            module = None
+            if module_name:
+                try:
+                    module = importlib.import_module(module_name)
+                except ImportError:
+                    pass
+            self._languages[file_extension] = _try_get_language(module, module_name)
+        return self._languages[file_extension]
     
     def get_parser(self, file_extension: str) -> Optional[Parser]:
         """Get or create a parser for the given file extension."""
-        if file_extension not in self._languages:
+        language = self._get_language(file_extension)
+        if language is None:
             return None
             
         if file_extension not in self._parsers:
@@ -128,9 +112,9 @@ class TreeSitterManager:
             try:
                 # Try both old and new API methods
                 if hasattr(parser, 'set_language'):
-                    parser.set_language(self._languages[file_extension])
+                    parser.set_language(language)
                 elif hasattr(parser, 'language'):
-                    parser.language = self._languages[file_extension]
+                    parser.language = language
                 else:
                     print(f"Could not set language for {file_extension}: No suitable method found")
                     return None
@@ -163,6 +147,41 @@ def estimate_token_count(text: str) -> int:
     return len(text) // 4
 
 
+def _declarator_name_node(node: Node) -> Optional[Node]:
+    """Follow a C/C++ declarator chain down to the declared identifier."""
+    while node is not None and node.type not in DECLARATOR_NAME_TYPES:
+        inner = node.child_by_field_name("declarator")
+        if inner is None and node.named_children:
+            # reference_declarator wraps its declarator without a field name
+            inner = node.named_children[-1]
+        node = inner
+    return node
+
+
+def _node_name(node: Node) -> str:
+    """Return the declared name of a function/class node, or an empty string."""
+    name_node = node.child_by_field_name("name")
+    if name_node is None and node.type == "impl_item":
+        # impl blocks are named after the implemented type (Foo in `impl<T> Foo<T>`)
+        name_node = node.child_by_field_name("type")
+        if name_node is not None and name_node.type == "generic_type":
+            name_node = name_node.child_by_field_name("type")
+    if name_node is None:
+        declarator = node.child_by_field_name("declarator")
+        if declarator is not None:
+            name_node = _declarator_name_node(declarator)
+    if name_node is None or name_node.text is None:
+        return ""
+    return name_node.text.decode("utf-8", errors="replace")
+
+
+def _join_symbol_path(parent_path: str, name: str) -> str:
+    """Join a parent symbol path and a symbol name with a dot."""
+    if not name:
+        return parent_path
+    return f"{parent_path}.{name}" if parent_path else name
+
+
 def collapse_node_content(node: Node, original_content: str) -> str:
     """Create a collapsed version of a node's content."""
     if node.type in ["block", "statement_block", "compound_statement"]:
@@ -223,29 +242,32 @@ class CodeChunker:
             
         return chunks
     
-    async def _extract_semantic_chunks(self, node: Node, content: str, file_path: str, chunks: List[ChunkWithLocation]):
+    async def _extract_semantic_chunks(self, node: Node, content: str, file_path: str, chunks: List[ChunkWithLocation],
+                                       parent_path: str = ""):
         """Extract semantic chunks (functions, classes, etc.) from the AST."""
         
         # Check if this node is a function or class we want to extract
         if node.type in self.function_types:
-            await self._add_function_chunk(node, content, file_path, chunks)
+            await self._add_function_chunk(node, content, file_path, chunks, parent_path)
             return  # Don't recurse into children of functions
             
         if node.type in self.class_types:
-            await self._add_class_chunk(node, content, file_path, chunks)
+            class_path = _join_symbol_path(parent_path, _node_name(node))
+            await self._add_class_chunk(node, content, file_path, chunks, parent_path)
             # Also recurse into class body to extract individual methods
             for child in node.children:
                 if child.type in self.block_types:
                     for method in child.children:
                         if method.type in self.function_types:
-                            await self._add_function_chunk(method, content, file_path, chunks)
+                            await self._add_function_chunk(method, content, file_path, chunks, class_path)
             return
         
         # For other nodes, recurse into children
         for child in node.children:
-            await self._extract_semantic_chunks(child, content, file_path, chunks)
+            await self._extract_semantic_chunks(child, content, file_path, chunks, parent_path)
     
-    async def _add_function_chunk(self, node: Node, content: str, file_path: str, chunks: List[ChunkWithLocation]):
+    async def _add_function_chunk(self, node: Node, content: str, file_path: str, chunks: List[ChunkWithLocation],
+                                  parent_path: str = ""):
         """Add a function as a chunk."""
         function_content = content[node.start_byte:node.end_byte]
         
@@ -254,16 +276,11 @@ class CodeChunker:
             collapsed_content = await self._create_collapsed_function(node, content)
             function_content = collapsed_content
         
-        chunks.append(ChunkWithLocation(
-            content=function_content,
-            file_path=file_path,
-            start_line=node.start_point[0],
-            end_line=node.end_point[0],
-            start_char=node.start_byte,
-            end_char=node.end_byte
-        ))
+        kind = "method" if parent_path else "function"
+        chunks.append(self._make_symbol_chunk(node, function_content, file_path, parent_path, kind))
     
-    async def _add_class_chunk(self, node: Node, content: str, file_path: str, chunks: List[ChunkWithLocation]):
+    async def _add_class_chunk(self, node: Node, content: str, file_path: str, chunks: List[ChunkWithLocation],
+                               parent_path: str = ""):
         """Add a class as a chunk (collapsed overview)."""
         class_content = content[node.start_byte:node.end_byte]
         
@@ -272,14 +289,27 @@ class CodeChunker:
             collapsed_content = await self._create_collapsed_class(node, content)
             class_content = collapsed_content
         
-        chunks.append(ChunkWithLocation(
-            content=class_content,
+        chunks.append(self._make_symbol_chunk(node, class_content, file_path, parent_path, "class"))
+    
+    def _make_symbol_chunk(self, node: Node, chunk_content: str, file_path: str,
+                           parent_path: str, kind: str) -> ChunkWithLocation:
+        """Build a chunk for a function/class node with its AST metadata."""
+        name = _node_name(node)
+        return ChunkWithLocation(
+            content=chunk_content,
             file_path=file_path,
             start_line=node.start_point[0],
             end_line=node.end_point[0],
             start_char=node.start_byte,
-            end_char=node.end_byte
-        ))
+            end_char=node.end_byte,
+            symbol_path=_join_symbol_path(parent_path, name),
+            symbol_name=name,
+            symbol_kind=kind,
+            language=language_for_path(file_path),
+            node_type=node.type,
+            parent_symbol=parent_path,
+            depth=len(parent_path.split('.')) if parent_path else 0
+        )
     
     async def _create_collapsed_function(self, node: Node, content: str) -> str:
         """Create a collapsed version of a function showing signature and key structure."""
@@ -354,7 +384,8 @@ class CodeChunker:
                     start_line=start_line,
                     end_line=i - 1,
                     start_char=start_char,
-                    end_char=end_char
+                    end_char=end_char,
+                    language=language_for_path(file_path)
                 ))
                 
                 # Start new chunk
@@ -377,7 +408,8 @@ class CodeChunker:
                 start_line=start_line,
                 end_line=len(lines) - 1,
                 start_char=start_char,
-                end_char=end_char
+                end_char=end_char,
+                language=language_for_path(file_path)
             ))
         
         return chunks 
\ No newline at end of file
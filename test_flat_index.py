@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Tests for the flat vector index snapshots and their filters."""
+
+import os
+
+import numpy as np
+import pytest
+
+from code_rag.database import build_filter, parse_filter
+from code_rag.flat_index import (
+    CATEGORY_COLUMNS, CURRENT_FILE, INT_COLUMNS, KEEP_SNAPSHOTS, SNAPSHOTS_DIR, TEXT_COLUMNS,
+    FlatIndex, _remove_old_snapshots, current_snapshot, publish_snapshot,
+)
+
+DIM = 4
+
+
+def make_rows(count, start=0):
+    """Chunk IDs, embeddings and columns for ``count`` rows."""
+    ids = [f"chunk-{i}" for i in range(start, start + count)]
+    vectors = np.eye(DIM, dtype=np.float32)[[i % DIM for i in range(start, start + count)]] * 2.0
+    columns = {column: [f"{column}-{i % 2}" for i in range(start, start + count)] for column in CATEGORY_COLUMNS}
+    # Quotes and " AND " inside values must survive build_filter/parse_filter
+    columns["repository_path"] = [
+        "/repo/it's here" if i % 4 >= 2 else "/repo/a AND b" for i in range(start, start + count)
+    ]
+    columns["chunk_type"] = ["function" if i % 2 else "class" for i in range(start, start + count)]
+    columns.update({column: [f"{column} {i} ünïcode" for i in range(start, start + count)] for column in TEXT_COLUMNS})
+    columns.update({column: [i * 10 for i in range(start, start + count)] for column in INT_COLUMNS})
+    return ids, vectors, columns
+
+
+def publish(root, count, version=1, batch_size=3):
+    """Publish a snapshot of ``count`` rows written in several batches."""
+    batches = [make_rows(min(batch_size, count - start), start) for start in range(0, count, batch_size)]
+    return publish_snapshot(root, iter(batches), count, DIM, version, "float32")
+
+
+def test_publish_and_load_round_trip(tmp_path):
+    root = str(tmp_path)
+    assert current_snapshot(root) is None
+
+    path = publish(root, 7, version=3)
+    assert current_snapshot(root) == path
+
+    index = FlatIndex.load(path)
+    assert len(index) == 7
+    assert index.version == 3
+
+    ids, vectors, columns = make_rows(7)
+    for row in range(7):
+        values = index.row(row)
+        assert values["id"] == ids[row]
+        for column in [*CATEGORY_COLUMNS, *TEXT_COLUMNS, *INT_COLUMNS]:
+            assert values[column] == columns[column][row]
+        # Stored embeddings are unit length
+        assert np.allclose(values["embedding"], vectors[row] / 2.0)
+
+
+def test_search_returns_closest_rows_first(tmp_path):
+    index = FlatIndex.load(publish(str(tmp_path), 8))
+
+    (results,) = index.search([[0.0, 1.0, 0.1, 0.0]], top_k=3)
+    rows = [row for row, _ in results]
+    distances = [distance for _, distance in results]
+    # Rows 1 and 5 point along the second axis
+    assert sorted(rows[:2]) == [1, 5]
+    assert distances == sorted(distances)
+    assert distances[0] == pytest.approx(1.0 - 1.0 / np.sqrt(1.01), abs=1e-5)
+
+
+def test_search_batch_matches_single_queries(tmp_path):
+    index = FlatIndex.load(publish(str(tmp_path), 8))
+    queries = [[1.0, 0.2, 0.0, 0.0], [0.0, 0.0, 0.3, 1.0]]
+
+    batched = index.search(queries, top_k=4)
+    assert batched == [index.search([query], top_k=4)[0] for query in queries]
+
+
+def test_filters_round_trip_through_build_filter(tmp_path):
+    index = FlatIndex.load(publish(str(tmp_path), 8))
+
+    for repository_path in ["/repo/it's here", "/repo/a AND b"]:
+        where = build_filter(repository_path=repository_path, chunk_type="function")
+        filters = parse_filter(where)
+        assert filters == {"repository_path": repository_path, "chunk_type": "function"}
+
+        expected = [
+            row for row in range(len(index))
+            if index.row(row)["repository_path"] == repository_path and index.row(row)["chunk_type"] == "function"
+        ]
+        assert np.flatnonzero(index.mask(filters)).tolist() == expected
+
+    # Matching rows only, still closest first
+    mask = index.mask(parse_filter(build_filter(chunk_type="function")))
+    (results,) = index.search([[0.0, 1.0, 0.0, 0.0]], top_k=10, masks=[mask])
+    rows = [row for row, _ in results]
+    assert sorted(rows[:2]) == [1, 5] and sorted(rows[2:]) == [3, 7]
+
+
+def test_mask_edge_cases(tmp_path):
+    index = FlatIndex.load(publish(str(tmp_path), 4))
+
+    assert index.mask(None) is None
+    assert index.mask({}) is None
+    assert not index.mask({"chunk_type": "no such type"}).any()
+    (results,) = index.search([[1.0, 0.0, 0.0, 0.0]], top_k=3, masks=[index.mask({"chunk_type": "missing"})])
+    assert results == []
+
+
+def test_parse_filter_rejects_other_predicates():
+    assert parse_filter(None) == {}
+    assert parse_filter("chunk_type = 'function' OR 1 = 1") is None
+    assert parse_filter("content = 'x'") is None
+    assert parse_filter("chunk_type LIKE 'func%'") is None
+
+
+def test_empty_snapshot(tmp_path):
+    index = FlatIndex.load(publish(str(tmp_path), 0))
+
+    assert len(index) == 0
+    assert index.search([[1.0, 0.0, 0.0, 0.0]], top_k=5) == [[]]
+    assert not index.mask({"chunk_type": "function"}).any()
+
+
+def test_write_rejects_row_count_mismatch(tmp_path):
+    root = str(tmp_path)
+    with pytest.raises(RuntimeError):
+        publish_snapshot(root, iter([make_rows(3)]), 5, DIM, 1, "float32")
+    # The failed snapshot is cleaned up and nothing is published
+    assert current_snapshot(root) is None
+    assert os.listdir(os.path.join(root, SNAPSHOTS_DIR)) == []
+
+
+def test_load_incomplete_snapshot(tmp_path):
+    assert FlatIndex.load(str(tmp_path)) is None
+
+
+def test_publish_keeps_newest_snapshots(tmp_path):
+    root = str(tmp_path)
+    paths = [publish(root, 2, version=version) for version in range(KEEP_SNAPSHOTS + 2)]
+
+    remaining = sorted(os.listdir(os.path.join(root, SNAPSHOTS_DIR)))
+    assert remaining == sorted(os.path.basename(path) for path in paths[-KEEP_SNAPSHOTS:])
+    with open(os.path.join(root, CURRENT_FILE)) as f:
+        assert f.read() == os.path.basename(paths[-1])
+
+
+def test_remove_old_snapshots_never_removes_kept_snapshot(tmp_path):
+    snapshots_dir = tmp_path / SNAPSHOTS_DIR
+    names = [f"v{i}" for i in range(5)]
+    for age, name in enumerate(reversed(names)):
+        (snapshots_dir / name).mkdir(parents=True)
+        mtime = 1_000_000 - age * 100
+        os.utime(snapshots_dir / name, (mtime, mtime))
+
+    # The kept snapshot is the oldest one, e.g. republished by another process
+    _remove_old_snapshots(str(tmp_path), keep="v0")
+
+    assert sorted(os.listdir(snapshots_dir)) == sorted(["v0", *names[-(KEEP_SNAPSHOTS - 1):]])
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""Unit tests for the building blocks of the indexing and search pipeline."""
+
+import asyncio
+import time
+
+import lancedb
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from code_rag.batching import MicroBatcher
+from code_rag.cache import EmbeddingCache, LRUCache
+from code_rag.cascade import Candidate, plan_cascade
+from code_rag.circuit_breaker import CircuitBreaker
+from code_rag.config import CodeRAGConfig
+from code_rag.database import CodeChunk, DatabaseManager, compute_chunk_id, compute_chunk_ids
+from code_rag.deadline import Deadline
+from code_rag.diversity import diversify_candidates, mmr_rank
+from code_rag.embeddings import RerankingService
+from code_rag.packing import ELISION_MARKER, pack_documents, trim_to_tokens
+from code_rag.search import reciprocal_rank_fusion
+from code_rag.symbols import SymbolEntry, SymbolIndex, looks_like_identifier
+from code_rag.tracing import add_trace_hook, remove_trace_hook, trace_span
+from code_rag.tree_sitter_utils import ChunkWithLocation, estimate_token_count
+
+
+def test_trim_to_tokens_keeps_short_text():
+    assert trim_to_tokens("def f():\n    pass\n", 100) == "def f():\n    pass\n"
+
+
+def test_trim_to_tokens_keeps_head_and_tail():
+    lines = [f"line {i:03d} " + "x" * 20 for i in range(100)]
+    text = "\n".join(lines)
+
+    trimmed = trim_to_tokens(text, 100)
+
+    assert estimate_token_count(trimmed) <= 100
+    assert trimmed.startswith(lines[0])
+    assert trimmed.endswith(lines[-1])
+    assert ELISION_MARKER in trimmed
+
+
+def test_pack_documents_covers_every_document_within_budget():
+    documents = ["short doc", "a" * 400, "b" * 2000, "c" * 40, "d" * 300]
+
+    batches = pack_documents("query text", documents, max_tokens=200, doc_max_tokens=120, pair_overhead_tokens=5)
+
+    assert [i for batch in batches for i in batch.indices] == list(range(len(documents)))
+    for batch in batches:
+        assert batch.tokens <= 200
+        assert len(batch.indices) == len(batch.documents)
+        for text in batch.documents:
+            assert estimate_token_count(text) <= 120
+
+
+def test_pack_documents_caps_documents_at_query_room():
+    batches = pack_documents("q" * 400, ["x" * 4000], max_tokens=150, doc_max_tokens=1000)
+
+    assert len(batches) == 1
+    assert estimate_token_count(batches[0].documents[0]) <= 50
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("code_rag.circuit_breaker.time.monotonic", lambda: now[0])
+
+    async def scenario():
+        healthy = [False]
+
+        async def health_check():
+            return healthy[0]
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10, health_check=health_check)
+        for _ in range(2):
+            assert await breaker.allow_request()
+            breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not await breaker.allow_request()
+
+        # Unhealthy probe after the timeout keeps the circuit open
+        now[0] += 11
+        assert not await breaker.allow_request()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        # Healthy probe lets exactly one trial request through
+        now[0] += 11
+        healthy[0] = True
+        assert await breaker.allow_request()
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert not await breaker.allow_request()
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert await breaker.allow_request()
+
+    asyncio.run(scenario())
+
+
+def test_circuit_breaker_failed_trial_reopens(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("code_rag.circuit_breaker.time.monotonic", lambda: now[0])
+
+    async def scenario():
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout_s=5)
+        breaker.record_failure()
+        now[0] += 6
+        assert await breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert not await breaker.allow_request()
+
+    asyncio.run(scenario())
+
+
+def test_micro_batcher_coalesces_concurrent_calls():
+    async def scenario():
+        calls = []
+
+        async def process_batch(items):
+            calls.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(process_batch, window_ms=5, max_batch=4)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+
+        assert results == [i * 2 for i in range(6)]
+        assert calls == [[0, 1, 2, 3], [4, 5]]
+        assert (batcher.batches_sent, batcher.items_sent) == (2, 6)
+
+    asyncio.run(scenario())
+
+
+def test_micro_batcher_propagates_batch_errors():
+    async def scenario():
+        async def process_batch(items):
+            raise ValueError("endpoint down")
+
+        batcher = MicroBatcher(process_batch, window_ms=0)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+
+def make_symbol_index():
+    return SymbolIndex([
+        SymbolEntry("1", "search", "SearchService.search", "method", "python"),
+        SymbolEntry("2", "search_many", "SearchService.search_many", "method", "python"),
+        SymbolEntry("3", "Search", "Search", "class", "python"),
+        SymbolEntry("4", "SearchService", "SearchService", "class", "python"),
+        SymbolEntry("5", "parse", "parse", "function", "rust"),
+    ])
+
+
+def test_symbol_index_ranks_exact_before_prefix():
+    matches = make_symbol_index().lookup("search")
+
+    assert [(match.entry.chunk_id, match.match_type) for match in matches] == [
+        ("1", "exact"), ("3", "exact_ci"), ("2", "prefix"), ("4", "prefix"),
+    ]
+
+
+def test_symbol_index_qualified_names_and_limits():
+    index = make_symbol_index()
+
+    assert [match.entry.chunk_id for match in index.lookup("SearchService.search")] == ["1", "2"]
+    assert [match.entry.chunk_id for match in index.lookup("SearchService.search", allow_prefix=False)] == ["1"]
+    assert len(index.lookup("s", limit=2)) == 2
+    assert index.lookup("  ") == []
+    assert index.lookup("missing") == []
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("parse_gitignore", True),
+    ("SearchService.search", True),
+    ("how does search work", False),
+    ("search()", False),
+])
+def test_looks_like_identifier(query, expected):
+    assert looks_like_identifier(query) == expected
+
+
+EMBEDDING_DIM = 2560
+
+
+def make_candidate(name, embedding, cheap_score):
+    chunk = CodeChunk(
+        id=name, content=name, file_path=f"{name}.py", start_line=0, end_line=1, start_char=0, end_char=1,
+        file_extension=".py", repository_path="/repo", chunk_type="function", embedding=embedding
+    )
+    return Candidate(chunk, cheap_score=cheap_score)
+
+
+def near_variants_and_distinct(variants=6, distinct=5):
+    """Near-variants of one chunk (cosine ~0.9) scoring above unrelated chunks."""
+    rng = np.random.default_rng(0)
+    base = rng.normal(size=EMBEDDING_DIM)
+    candidates = []
+    for i in range(variants):
+        embedding = base + 0.33 * rng.normal(size=EMBEDDING_DIM)
+        candidates.append(make_candidate(f"variant{i}", embedding.tolist(), 0.60 - 0.01 * i))
+    for i in range(distinct):
+        candidates.append(make_candidate(f"distinct{i}", rng.normal(size=EMBEDDING_DIM).tolist(), 0.50 - 0.01 * i))
+    return candidates
+
+
+def names(candidates):
+    return [candidate.chunk.id for candidate in candidates]
+
+
+def test_plan_cascade_early_exit_on_margin():
+    scores = [0.9, 0.8, 0.3, 0.2]
+    candidates = [make_candidate(str(i), [0.0] * EMBEDDING_DIM, score) for i, score in enumerate(scores)]
+
+    plan = plan_cascade(candidates, top_k=2, accept_score=0.95, reject_score=0.1, max_rerank=10, margin=0.2)
+
+    assert plan.early_exit
+    assert names(plan.accepted) == ["0", "1"]
+    assert plan.to_rerank == []
+    assert plan.rejected == 2
+
+
+def test_plan_cascade_bands_between_reject_and_accept():
+    scores = [0.2, 0.9, 0.5, 0.05, 0.6, 0.4]
+    candidates = [make_candidate(str(i), [0.0] * EMBEDDING_DIM, score) for i, score in enumerate(scores)]
+
+    plan = plan_cascade(candidates, top_k=3, accept_score=0.85, reject_score=0.1, max_rerank=3, margin=0.5)
+
+    assert not plan.early_exit
+    assert names(plan.accepted) == ["1"]
+    assert names(plan.to_rerank) == ["4", "2", "5"]
+    assert plan.rejected == 2
+
+    kept = plan_cascade(candidates, top_k=3, accept_score=0.85, reject_score=0.1, max_rerank=3, margin=0.5,
+                        keep_order=True)
+    assert names(kept.to_rerank) == ["0", "2", "4"]
+
+
+def test_diversified_band_reaches_past_near_variants():
+    candidates, duplicates = diversify_candidates(
+        near_variants_and_distinct(), duplicate_threshold=0.95, mmr_lambda=0.7
+    )
+    assert duplicates == 0
+
+    plan = plan_cascade(candidates, top_k=5, accept_score=0.85, reject_score=0.1, max_rerank=4, margin=0.5,
+                        keep_order=True)
+
+    assert names(plan.to_rerank) == ["variant0", "distinct0", "distinct1", "distinct2"]
+
+
+def test_diversify_drops_near_duplicates():
+    candidates = near_variants_and_distinct(variants=3, distinct=2)
+
+    kept, duplicates = diversify_candidates(candidates, duplicate_threshold=0.85, mmr_lambda=1.0)
+
+    assert duplicates == 2
+    assert names(kept) == ["variant0", "distinct0", "distinct1"]
+
+
+def test_mmr_rank_interleaves_clusters():
+    candidates = near_variants_and_distinct(variants=3, distinct=2)
+    relevance = [candidate.cheap_score for candidate in candidates]
+
+    assert names(mmr_rank(candidates, relevance, mmr_lambda=1.0)) == names(candidates)
+    assert names(mmr_rank(candidates, relevance, mmr_lambda=0.7))[:3] == ["variant0", "distinct0", "distinct1"]
+
+
+def test_rerank_leaves_unscored_documents_without_a_score():
+    config = CodeRAGConfig()
+    config.api.rerank_degraded_mode = "none"
+    service = RerankingService(config)
+    # Circuit open: documents go straight to the degraded path
+    service.breaker.state = CircuitBreaker.OPEN
+    service.breaker._opened_at = time.monotonic()
+
+    ranked = asyncio.run(service.rerank_with_scores("query", ["a", "b", "c"], top_k=3))
+
+    assert ranked == [(0, None), (1, None), (2, None)]
+
+
+def test_rerank_ranks_scored_documents_before_unscored():
+    service = RerankingService(CodeRAGConfig())
+
+    async def score_documents(query, documents, usage=None):
+        return [None, 0.2, 0.9, None]
+
+    service._score_documents = score_documents
+    ranked = asyncio.run(service.rerank_with_scores("query", ["a", "b", "c", "d"], top_k=3))
+
+    assert ranked == [(2, 0.9), (1, 0.2), (0, None)]
+    # Only real scores are cached
+    assert len(service.score_cache) == 2
+
+
+def make_location(content, symbol_path="", start_line=0, file_path="src/app.py"):
+    return ChunkWithLocation(
+        content=content, file_path=file_path, start_line=start_line, end_line=start_line + 1,
+        start_char=start_line * 10, end_char=start_line * 10 + len(content), symbol_path=symbol_path
+    )
+
+
+def test_chunk_ids_are_stable_across_edits_elsewhere():
+    before = [make_location("import os", start_line=0), make_location("def run(): ...", "run", start_line=2)]
+    # A line inserted above moves the function but does not change it
+    after = [make_location("import os, sys", start_line=0), make_location("def run(): ...", "run", start_line=5)]
+
+    assert compute_chunk_ids("/repo", before)[1] == compute_chunk_ids("/repo", after)[1]
+    assert compute_chunk_ids("/repo", before)[0] != compute_chunk_ids("/repo", after)[0]
+
+
+def test_chunk_ids_depend_on_repository_file_and_symbol():
+    chunk = make_location("def run(): ...", "run")
+    ids = {
+        compute_chunk_id("/repo", chunk),
+        compute_chunk_id("/other", chunk),
+        compute_chunk_id("/repo", chunk._replace(file_path="src/other.py")),
+        compute_chunk_id("/repo", chunk._replace(symbol_path="Runner.run")),
+    }
+    assert len(ids) == 4
+
+
+def test_identical_chunks_in_one_file_get_distinct_ids():
+    chunks = [make_location("x = 1", start_line=0), make_location("y = 2", start_line=1),
+              make_location("x = 1", start_line=5)]
+
+    ids = compute_chunk_ids("/repo", chunks)
+
+    assert len(set(ids)) == 3
+    # The first occurrence keeps the plain ID
+    assert ids[0] == compute_chunk_id("/repo", chunks[0])
+
+
+def test_tables_from_older_versions_get_the_new_columns(tmp_path):
+    old_columns = ["id", "content", "file_path", "start_line", "end_line", "start_char", "end_char",
+                   "file_extension", "repository_path", "chunk_type", "embedding"]
+    old_schema = pa.schema([CodeChunk.to_arrow_schema().field(name) for name in old_columns])
+    lancedb.connect(str(tmp_path)).create_table("code_chunks", schema=old_schema)
+
+    config = CodeRAGConfig()
+    config.database.path = str(tmp_path)
+    manager = DatabaseManager(config)
+    asyncio.run(manager.initialize())
+
+    assert set(manager.table.schema.names) == set(CodeChunk.to_arrow_schema().names)
+
+
+def test_tables_missing_core_columns_fail_fast(tmp_path):
+    lancedb.connect(str(tmp_path)).create_table("code_chunks", schema=pa.schema([pa.field("id", pa.string())]))
+
+    config = CodeRAGConfig()
+    config.database.path = str(tmp_path)
+    with pytest.raises(RuntimeError, match="cannot be upgraded"):
+        asyncio.run(DatabaseManager(config).initialize())
+
+
+def test_rrf_ranks_chunks_found_by_both_retrievers_first():
+    a, b, c, d = (make_candidate(name, [0.0] * EMBEDDING_DIM, 0.0).chunk for name in "abcd")
+
+    fused = reciprocal_rank_fusion([[a, b, c], [c, d]], k=60)
+
+    # b and d are both second in one ranking; the tie keeps first-seen order
+    assert [chunk.id for chunk, _ in fused] == ["c", "a", "b", "d"]
+    assert fused[0][1] == pytest.approx(1 / 63 + 1 / 61)
+
+
+def test_rrf_weights_and_ties():
+    a, b = (make_candidate(name, [0.0] * EMBEDDING_DIM, 0.0).chunk for name in "ab")
+
+    # Equal scores keep the order in which the chunks were first seen
+    tied = reciprocal_rank_fusion([[a], [b]])
+    assert [chunk.id for chunk, _ in tied] == ["a", "b"]
+    assert tied[0][1] == tied[1][1]
+
+    weighted = reciprocal_rank_fusion([[a], [b]], weights=[1.0, 2.0])
+    assert [chunk.id for chunk, _ in weighted] == ["b", "a"]
+    assert reciprocal_rank_fusion([]) == []
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_lru_cache_expires_entries_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("code_rag.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(max_size=4, ttl_seconds=10)
+    cache.put("a", 1)
+
+    now[0] += 10
+    assert cache.get("a") == 1
+    now[0] += 1
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_embedding_cache_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache" / "queries.sqlite")
+    key = EmbeddingCache.make_key("model", "instruction", "find  the parser")
+    cache = EmbeddingCache(max_size=4, path=path)
+    cache.put(key, [0.5, -1.25, 2.0])
+    cache.close()
+
+    reopened = EmbeddingCache(max_size=4, path=path)
+    assert reopened.get(key) == [0.5, -1.25, 2.0]
+    assert reopened.disk_hits == 1
+    # Served from memory afterwards
+    assert reopened.get(key) == [0.5, -1.25, 2.0]
+    assert reopened.disk_hits == 1
+    reopened.close()
+
+
+def test_embedding_cache_keys_cover_model_and_normalize_whitespace():
+    key = EmbeddingCache.make_key("model-a", "instruction", "find the parser")
+
+    assert EmbeddingCache.make_key("model-a", "instruction", "  find the\tparser ") == key
+    assert EmbeddingCache.make_key("model-b", "instruction", "find the parser") != key
+    assert EmbeddingCache.make_key("model-a", "instruction", "Find the parser") != key
+
+
+def test_rerank_scores_are_cached_per_query_and_document():
+    service = RerankingService(CodeRAGConfig())
+    scored = []
+
+    async def score_documents(query, documents, usage=None):
+        scored.append(list(documents))
+        return [float(len(document)) for document in documents]
+
+    service._score_documents = score_documents
+    asyncio.run(service.rerank_with_scores("query", ["a", "bb"], top_k=2))
+    ranked = asyncio.run(service.rerank_with_scores("query", ["bb", "ccc"], top_k=3))
+
+    assert scored == [["a", "bb"], ["ccc"]]
+    assert ranked == [(1, 3.0), (0, 2.0)]
+
+    # Another query is scored again
+    asyncio.run(service.rerank_with_scores("other query", ["a"], top_k=1))
+    assert scored[-1] == ["a"]
+
+
+def test_rerank_cache_is_cleared_when_the_model_changes():
+    config = CodeRAGConfig()
+    service = RerankingService(config)
+
+    async def score_documents(query, documents, usage=None):
+        return [0.5] * len(documents)
+
+    service._score_documents = score_documents
+    asyncio.run(service.rerank_with_scores("query", ["a", "b"], top_k=2))
+    assert len(service.score_cache) == 2
+
+    config.api.reranking_model = "another-reranker"
+    asyncio.run(service.rerank_with_scores("query", ["c"], top_k=1))
+    assert len(service.score_cache) == 1
+
+
+def test_deadline_run_times_out():
+    async def scenario():
+        deadline = Deadline(20)
+        with pytest.raises(asyncio.TimeoutError):
+            await deadline.run(asyncio.sleep(1))
+        assert deadline.expired()
+        assert deadline.remaining_ms() == 0.0
+
+    asyncio.run(scenario())
+
+
+def test_deadline_without_budget_never_expires():
+    async def scenario():
+        deadline = Deadline()
+        assert deadline.unlimited
+        assert deadline.remaining_ms() == float("inf")
+        assert await deadline.run(asyncio.sleep(0.01, result="done")) == "done"
+        assert not deadline.expired()
+
+    asyncio.run(scenario())
+
+
+def test_trace_span_without_opentelemetry(monkeypatch):
+    monkeypatch.setattr("code_rag.tracing.otel_trace", None)
+    spans = []
+    add_trace_hook(spans.append)
+    try:
+        timings = {}
+        with trace_span("search.embed", timings, model="m") as span:
+            span.attributes["cached"] = True
+        with pytest.raises(ValueError):
+            with trace_span("search.embed", timings):
+                raise ValueError("boom")
+    finally:
+        remove_trace_hook(spans.append)
+
+    assert [span.name for span in spans] == ["search.embed", "search.embed"]
+    assert spans[0].attributes == {"model": "m", "cached": True}
+    assert spans[0].error is None and "boom" in spans[1].error
+    # Durations of a repeated stage add up under the unprefixed name
+    assert list(timings) == ["embed"]
+    assert timings["embed"] == pytest.approx(spans[0].duration_ms + spans[1].duration_ms)
+
+
+def test_failing_trace_hook_does_not_break_the_stage():
+    def broken_hook(span):
+        raise RuntimeError("hook failed")
+
+    add_trace_hook(broken_hook)
+    try:
+        with trace_span("index.upsert") as span:
+            pass
+    finally:
+        remove_trace_hook(broken_hook)
+    assert span.duration_ms >= 0